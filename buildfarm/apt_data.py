@@ -2,53 +2,113 @@
 
 from __future__ import print_function
 
+import array
+import bz2
+import cPickle
+import errno
 import gzip
+import hashlib
+import json
 import logging
 import os
+import Queue
 import socket
+import threading
 from StringIO import StringIO
 import time
 import urllib2
 import yaml
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
 
 from rospkg.distro import distro_uri
 
+from buildfarm.deb822 import CHUNK_SIZE, iter_stanzas
+from buildfarm.pdiff import apply_ed_script, get_patch_names, parse_diff_index, PdiffError
+
+
+DEFAULT_FETCH_JOBS = 8
+
+
+def get_version_data(rootdir, rosdistro_name, ros_repos, distro_arches, apt_update=True, jobs=DEFAULT_FETCH_JOBS, name_prefixes=None, index=None):
+    """
+    :param name_prefixes: tuple of prefixes, if given only debian packages
+      starting with one of them are extracted from the apt list files
+    :param index: the rosdistro index, fetched if not passed
+    """
+    rosdistro_data = RosdistroData(rosdistro_name, index=index)
 
-def get_version_data(rootdir, rosdistro_name, ros_repos, distro_arches, apt_update=True):
-    rosdistro_data = RosdistroData(rosdistro_name)
+    apt_data = get_apt_data(rootdir, ros_repos, distro_arches, apt_update=apt_update,
+                            jobs=jobs, name_prefixes=name_prefixes, rosdistro_name=rosdistro_name)
 
+    return rosdistro_data, apt_data
+
+
+def get_apt_data(rootdir, ros_repos, distro_arches, apt_update=True, jobs=DEFAULT_FETCH_JOBS, name_prefixes=None, rosdistro_name=None):
+    """
+    Fetch and parse the apt list files of all repositories.
+
+    The resulting data can be shared between multiple ros distros as long
+    as `distro_arches` and `name_prefixes` cover all of them.
+
+    :param name_prefixes: tuple of prefixes, if given only debian packages
+      starting with one of them are extracted from the apt list files
+    """
     apt_data = AptData(rosdistro_name)
 
+    distros = set([d for (d, a) in distro_arches])
+
+    # fetch the small Release files first to detect which indices changed
+    releases = {}
+    if apt_update:
+        release_keys = [(repo_type, d) for repo_type in ros_repos for d in distros]
+
+        def fetch_release_for_key(key):
+            repo_type, d = key
+            return fetch_release(os.path.join(ros_repos[repo_type], 'dists/%s' % d))
+        releases = dict(run_concurrently(fetch_release_for_key, release_keys, jobs=jobs))
+
+    fetches = []
     # repo type (building, shadow-fixed, ros)
     for repo_type in ros_repos:
-        for d in set([d for (d, a) in distro_arches]):
-            # download list of source packages
-            da_str = "%s_source" % d
-            dst_filename = 'Sources'
-            url = os.path.join(ros_repos[repo_type], 'dists/%s/main/source/Sources.gz' % d)
-            datafile = fetch_gzip_file(rootdir, repo_type, da_str, url, dst_filename, reuse_existing=not apt_update)
-            # extract information
-            apt_data.fill_versions(repo_type, d, 'source', datafile)
+        for d in distros:
+            # list of source packages
+            fetches.append((repo_type, d, 'source', 'main/source/Sources.gz', 'Sources'))
 
         for (d, a) in distro_arches:
-            # download list of binary packages
-            da_str = "%s_%s" % (d, a)
-            dst_filename = 'Packages'
-            url = os.path.join(ros_repos[repo_type], 'dists/%s/main/binary-%s/Packages.gz' % (d, a))
-            datafile = fetch_gzip_file(rootdir, repo_type, da_str, url, dst_filename, reuse_existing=not apt_update)
-            # extract information
-            apt_data.fill_versions(repo_type, d, a, datafile)
+            # list of binary packages
+            fetches.append((repo_type, d, a, 'main/binary-%s/Packages.gz' % a, 'Packages'))
 
-    return rosdistro_data, apt_data
+    def fetch_index(fetch):
+        repo_type, d, a, index_path, dst_filename = fetch
+        da_str = '%s_%s' % (d, a)
+        release = releases.get((repo_type, d))
+        if release:
+            return fetch_index_file(rootdir, repo_type, da_str, release, index_path, dst_filename)
+        url = os.path.join(ros_repos[repo_type], 'dists/%s' % d, index_path)
+        return fetch_gzip_file(rootdir, repo_type, da_str, url, dst_filename, reuse_existing=not apt_update)
+
+    # extract information from each file as soon as its download finished
+    for (repo_type, d, a, _, _), datafile in run_concurrently(fetch_index, fetches, jobs=jobs):
+        apt_data.fill_versions(repo_type, d, a, datafile, name_prefixes=name_prefixes)
+
+    return apt_data
 
 
 class RosdistroData(object):
 
-    def __init__(self, rosdistro_name):
+    def __init__(self, rosdistro_name, index=None):
         self.packages = {}
         from buildfarm.ros_distro import Rosdistro
         # for fuerte we still fetch the new groovy rosdistro to get a list of distros
-        rd = Rosdistro(rosdistro_name if rosdistro_name != 'fuerte' else 'groovy')
+        rd = Rosdistro(rosdistro_name if rosdistro_name != 'fuerte' else 'groovy', index=index)
         self.rosdistro_index = rd._index
         self.rosdistro_dist = rd._dist
 
@@ -98,89 +158,537 @@ class RosdistroVersion(object):
 
 
 class AptData(object):
-    def __init__(self, rosdistro_name):
+    """
+    Versions of all debian packages in a columnar layout.
+
+    Each (repo_type, distro_arch) pair is a column storing one integer per
+    debian package which refers to the list of distinct version strings.
+    """
+
+    def __init__(self, rosdistro_name=None):
         self.rosdistro_name = rosdistro_name
+        # interned debian package name -> row index
         self.debian_packages = {}
+        self._repo_type_ids = {}
+        self._distro_arch_ids = {}
+        # columns indexed by repo type id and distro arch id
+        self._columns = []
+        # version id 0 is used for packages without a version
+        self._versions = [None]
+        self._version_ids = {None: 0}
         self._primary_arch = None  # fill with the first used arch
 
     def get_version(self, debian_name, repo_type, distro_arch):
-        if not debian_name in self.debian_packages:
+        row = self.debian_packages.get(debian_name)
+        if row is None:
+            return None
+        column = self._get_column(repo_type, distro_arch)
+        if column is None or row >= len(column):
             return None
-        return self.debian_packages[debian_name].get_version(repo_type, distro_arch)
+        return self._versions[column[row]]
 
-    def fill_versions(self, repo_type, distro, arch, datafile):
+    def get_rows(self, debian_names):
+        """
+        Look up the row indices of multiple debian packages at once.
+
+        :returns: list of row indices, None for unknown packages
+        """
+        return [self.debian_packages.get(debian_name) for debian_name in debian_names]
+
+    def get_column_versions(self, rows, repo_type, distro_arch):
+        """
+        Get the versions of multiple packages for one repo type and distro
+        arch.
+
+        :param rows: list of row indices as returned by :meth:`get_rows`
+        :returns: list of versions, None for missing packages
+        """
+        column = self._get_column(repo_type, distro_arch)
+        if column is None:
+            return [None] * len(rows)
+        versions = self._versions
+        length = len(column)
+        return [versions[column[row]] if row is not None and row < length else None for row in rows]
+
+    def fill_versions(self, repo_type, distro, arch, datafile, name_prefixes=None):
         """
         Extract information from apt 'Packages' / 'Sources' list files
         and fill in the versions.
+
+        :param name_prefixes: tuple of prefixes, if given only debian
+          packages starting with one of them are considered
         """
         if not self._primary_arch:
             self._primary_arch = arch
 
-        logging.debug('Reading file: %s' % datafile)
-        data = {}
-        # split package blocks
-        with open(datafile, 'r') as f:
-            blocks = f.read().split('\n\n')
-        blocks = [b.splitlines() for b in blocks if b]
-        # create dict by package name
-        for block in blocks:
-            prefix = 'Package: '
-            assert block[0].startswith(prefix)
-            data[block[0][len(prefix):]] = block
-
-        for debian_name in data:
-            pkg_data = data[debian_name]
-            # extract version of package
-            prefix = 'Version: '
-            versions = [l for l in pkg_data if l.startswith(prefix)]
-            version = versions[0] if len(versions) == 1 else None
-            if debian_name not in self.debian_packages:
-                self.debian_packages[debian_name] = AptVersion(debian_name)
-            self.debian_packages[debian_name].add_version(repo_type, '%s_%s' % (distro, arch), version)
+        distro_arch = '%s_%s' % (distro, arch)
+        values = []
+        for debian_name, version in load_versions(datafile, name_prefixes).iteritems():
+            row = self.debian_packages.get(debian_name)
+            if row is None:
+                row = len(self.debian_packages)
+                self.debian_packages[intern(debian_name)] = row
+            version_id = self._version_ids.get(version)
+            if version_id is None:
+                version_id = len(self._versions)
+                self._versions.append(version)
+                self._version_ids[version] = version_id
+            values.append((row, version_id))
+
+        column = self._get_column(repo_type, distro_arch, create=True)
+        column.extend([0] * (len(self.debian_packages) - len(column)))
+        for row, version_id in values:
+            column[row] = version_id
+
+    def _get_column(self, repo_type, distro_arch, create=False):
+        repo_type_id = self._repo_type_ids.get(repo_type)
+        distro_arch_id = self._distro_arch_ids.get(distro_arch)
+        if not create:
+            if repo_type_id is None or distro_arch_id is None:
+                return None
+            return self._columns[repo_type_id][distro_arch_id]
+
+        if repo_type_id is None:
+            repo_type_id = self._repo_type_ids[repo_type] = len(self._repo_type_ids)
+            self._columns.append([None] * len(self._distro_arch_ids))
+        if distro_arch_id is None:
+            distro_arch_id = self._distro_arch_ids[distro_arch] = len(self._distro_arch_ids)
+            for columns in self._columns:
+                columns.append(None)
+        if self._columns[repo_type_id][distro_arch_id] is None:
+            self._columns[repo_type_id][distro_arch_id] = array.array('i')
+        return self._columns[repo_type_id][distro_arch_id]
+
+
+PARSED_CACHE_FORMAT = 4
+
+
+def parse_versions(datafile, name_prefixes=None):
+    """
+    Parse an apt 'Packages' / 'Sources' list file.
+
+    :param name_prefixes: tuple of prefixes, stanzas of packages not
+      starting with any of them are skipped while scanning the file
+    :returns: dict mapping debian package names to versions
+    """
+    logging.debug('Reading file: %s' % datafile)
+    filter_func = None
+    if name_prefixes is not None:
+        filter_func = lambda name: name.startswith(name_prefixes)
+    versions = {}
+    with open(datafile, 'r') as f:
+        for stanza in iter_stanzas(f, ['Package', 'Version'], filter_field='Package', filter_func=filter_func):
+            versions[stanza['Package']] = stanza.get('Version')
+    return versions
+
+
+def get_versions_cache_path(datafile, name_prefixes=None):
+    """
+    Return the path of the parsed cache for a set of name prefixes.
+
+    Each set of prefixes gets its own file so that runs for different
+    rosdistros don't evict each other's cache.
+    """
+    if name_prefixes is None:
+        return datafile + '.versions'
+    prefixes_hash = hashlib.sha1('\n'.join(sorted(set(name_prefixes)))).hexdigest()
+    return '%s.versions-%s' % (datafile, prefixes_hash[:12])
+
+
+def load_versions(datafile, name_prefixes=None):
+    """
+    Get the versions from an apt list file using a persistent cache.
+
+    The parsed versions are stored next to the list file together with the
+    SHA256 of its content and the name prefixes.  As long as neither
+    changed the cached versions are loaded instead of parsing the file
+    again.  The SHA256 recorded in the fetch metadata is used if available,
+    only otherwise the file is hashed.
+
+    :param name_prefixes: tuple of prefixes, if given only debian
+      packages starting with one of them are returned
+    :returns: dict mapping debian package names to versions
+    """
+    sha256 = load_fetch_metadata(datafile).get('sha256')
+    if sha256 is None:
+        sha256 = get_file_sha256(datafile)
+    cache_key = (sha256, sorted(set(name_prefixes)) if name_prefixes is not None else None)
+    cache_file = get_versions_cache_path(datafile, name_prefixes)
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                cache_format, cached_key, versions = cPickle.load(f)
+            if cache_format == PARSED_CACHE_FORMAT and cached_key == cache_key:
+                logging.debug('Using parsed cache: %s' % cache_file)
+                return versions
+        except Exception as e:
+            logging.warn('Ignoring invalid parsed cache %s: %s' % (cache_file, e))
+
+    versions = parse_versions(datafile, name_prefixes)
+    with open(cache_file + '.tmp', 'wb') as f:
+        cPickle.dump((PARSED_CACHE_FORMAT, cache_key, versions), f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(cache_file + '.tmp', cache_file)
+    return versions
+
+
+def get_file_sha256(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
 
 
-class AptVersion(object):
-
-    def __init__(self, debian_name):
-        self.debian_name = debian_name
-        self._versions = {}
-
-    def add_version(self, repo_type, distro_arch, version):
-        self._versions[(repo_type, distro_arch)] = version
-
-    def get_version(self, repo_type, distro_arch):
-        return self._versions.get((repo_type, distro_arch), None)
+def load_url(url, retry=2, retry_period=1, timeout=10):
+    return open_url(url, retry=retry, retry_period=retry_period, timeout=timeout).read()
 
 
-def load_url(url, retry=2, retry_period=1, timeout=10):
+def open_url(url, headers=None, retry=2, retry_period=1, timeout=10):
+    request = urllib2.Request(url, headers=headers or {})
     try:
-        fh = urllib2.urlopen(url, timeout=timeout)
+        fh = urllib2.urlopen(request, timeout=timeout)
     except urllib2.HTTPError as e:
         if e.code == 503 and retry:
             time.sleep(retry_period)
-            return load_url(url, retry=retry - 1, retry_period=retry_period, timeout=timeout)
+            return open_url(url, headers=headers, retry=retry - 1, retry_period=retry_period, timeout=timeout)
         e.msg += ' (%s)' % url
         raise
     except urllib2.URLError as e:
         if isinstance(e.reason, socket.timeout) and retry:
             time.sleep(retry_period)
-            return load_url(url, retry=retry - 1, retry_period=retry_period, timeout=timeout)
+            return open_url(url, headers=headers, retry=retry - 1, retry_period=retry_period, timeout=timeout)
         raise urllib2.URLError(str(e) + ' (%s)' % url)
-    return fh.read()
+    return fh
+
+
+class Release(object):
+    """
+    The SHA256 sums and sizes of the indices listed in a 'Release' file.
+    """
+
+    def __init__(self, url, sha256sums, sizes):
+        self.url = url
+        self.sha256sums = sha256sums
+        self.sizes = sizes
+
+    def get_url(self, index_path):
+        return os.path.join(self.url, index_path)
+
+    def get_sha256(self, index_path):
+        return self.sha256sums.get(index_path)
+
+    def get_size(self, index_path):
+        return self.sizes.get(index_path)
+
+
+def fetch_release(url):
+    """
+    Fetch and parse the 'Release' (or 'InRelease') file of a distribution.
+
+    :param url: the url of the 'dists/<distro>' folder
+    :returns: :class:`Release` instance or None if neither file is
+      available or they don't contain SHA256 sums
+    """
+    for filename in ['Release', 'InRelease']:
+        try:
+            content = load_url(os.path.join(url, filename))
+        except urllib2.URLError as e:
+            logging.debug('Could not fetch %s file: %s' % (filename, e))
+            continue
+        if filename == 'InRelease':
+            content = strip_pgp_signature(content)
+        sha256sums = {}
+        sizes = {}
+        for stanza in iter_stanzas(StringIO(content), ['SHA256']):
+            for line in stanza.get('SHA256', '').splitlines():
+                parts = line.split()
+                if len(parts) == 3:
+                    sha256sums[parts[2]] = parts[0]
+                    sizes[parts[2]] = int(parts[1])
+        if sha256sums:
+            return Release(url, sha256sums, sizes)
+    return None
+
+
+def strip_pgp_signature(content):
+    """
+    Extract the signed message from a clearsigned OpenPGP document.
+    """
+    lines = content.splitlines()
+    if not lines or lines[0] != '-----BEGIN PGP SIGNED MESSAGE-----':
+        return content
+    # skip armor headers up to the first empty line
+    start = lines.index('') + 1 if '' in lines else 1
+    message = []
+    for line in lines[start:]:
+        if line == '-----BEGIN PGP SIGNATURE-----':
+            break
+        if line.startswith('- '):
+            line = line[2:]
+        message.append(line)
+    return '\n'.join(message) + '\n'
+
+
+def fetch_index_file(rootdir, repo_type, da_str, release, index_path, dst_filename):
+    """
+    Fetch an apt list file only if it changed according to the Release file.
+
+    If the repository publishes pdiffs for the index the cached file is
+    patched, otherwise the full file is downloaded using the smallest
+    compressed variant listed in the Release file which can be decompressed.
+
+    :param index_path: the path of the gzipped index relative to the
+      distribution folder, e.g. 'main/binary-amd64/Packages.gz'
+    """
+    base_path = index_path[:-len('.gz')] if index_path.endswith('.gz') else index_path
+    variants = [base_path + ext for ext in get_supported_extensions() if release.get_sha256(base_path + ext)]
+    if variants:
+        index_path = min(variants, key=release.get_size)
+    url = release.get_url(index_path)
+    path = os.path.join(rootdir, repo_type, da_str, dst_filename)
+    expected_sha256 = release.get_sha256(index_path)
+    if expected_sha256 and os.path.exists(path):
+        metadata = load_fetch_metadata(path)
+        if metadata.get('sha256') in [release.get_sha256(v) for v in variants]:
+            logging.debug('Apt list file unchanged: %s' % url)
+            return path
+
+        diff_index_path = '%s.diff/Index' % base_path
+        if release.get_sha256(diff_index_path):
+            try:
+                if update_with_pdiffs(path, release.get_url(diff_index_path)):
+                    metadata['url'] = url
+                    metadata['sha256'] = expected_sha256
+                    store_fetch_metadata(path, metadata)
+                    return path
+            except (urllib2.URLError, IOError, PdiffError) as e:
+                logging.warn('Failed to apply pdiffs to %s: %s' % (path, e))
+    return fetch_gzip_file(rootdir, repo_type, da_str, url, dst_filename)
+
+
+def update_with_pdiffs(path, diff_index_url):
+    """
+    Update a cached apt list file by applying the published pdiffs.
+
+    :returns: True if the file has been updated, False if the cached file
+      is too old to be patched
+    :raises: :exc:`PdiffError` if the patched file doesn't match the
+      expected SHA256
+    """
+    logging.debug('Fetching pdiff index: %s' % diff_index_url)
+    stanzas = list(iter_stanzas(StringIO(load_url(diff_index_url)), ['SHA256-Current', 'SHA256-History']))
+    if not stanzas:
+        raise PdiffError('Empty diff index: %s' % diff_index_url)
+    current_sha256, history = parse_diff_index(stanzas[0])
+
+    with open(path, 'r') as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if sha256 == current_sha256:
+        return True
+    patch_names = get_patch_names(history, sha256)
+    if patch_names is None:
+        return False
+
+    lines = content.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    del content
+    diff_url = os.path.dirname(diff_index_url)
+    for patch_name in patch_names:
+        patch_url = os.path.join(diff_url, '%s.gz' % patch_name)
+        logging.debug('Applying pdiff: %s' % patch_url)
+        g = gzip.GzipFile(fileobj=StringIO(load_url(patch_url)), mode='rb')
+        apply_ed_script(lines, g.read().split('\n'))
+
+    content = '\n'.join(lines) + '\n'
+    if hashlib.sha256(content).hexdigest() != current_sha256:
+        raise PdiffError('SHA256 mismatch after applying pdiffs to %s' % path)
+    with open(path + '.tmp', 'w') as f:
+        f.write(content)
+    remove_fetch_metadata(path)
+    os.rename(path + '.tmp', path)
+    return True
 
 
 def fetch_gzip_file(rootdir, repo_type, da_str, url, dst_filename, reuse_existing=False):
+    """
+    Download and extract an apt list file into the cache directory.
+
+    The file is decompressed while being downloaded and written to a
+    temporary file which replaces the cached file once it is complete.  The
+    compression is determined by the extension of the url.
+
+    Along with the extracted file the ETag / Last-Modified headers of the
+    response and the SHA256 of the downloaded file (as listed in the
+    Release file) are stored in a metadata file.  They are used to send a
+    conditional request on the next fetch and if the server reports that
+    the file has not been modified the cached file is used as-is.
+    """
     path = os.path.join(rootdir, repo_type, da_str)
     if not os.path.exists(path):
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            # another fetch might have created the directory concurrently
+            if e.errno != errno.EEXIST:
+                raise
     path = os.path.join(path, dst_filename)
-    if not reuse_existing or not os.path.exists(path):
-        logging.debug('Downloading apt list file: %s' % url)
-        yaml_gz_str = load_url(url)
-        yaml_gz_stream = StringIO(yaml_gz_str)
-        g = gzip.GzipFile(fileobj=yaml_gz_stream, mode='rb')
-        with open(path, 'w') as f:
-            f.write(g.read())
-    else:
+    if reuse_existing and os.path.exists(path):
         logging.debug('Reuse apt list file: %s' % path)
+        return path
+
+    metadata = load_fetch_metadata(path)
+    headers = {}
+    if metadata.get('url') == url and os.path.exists(path):
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    logging.debug('Downloading apt list file: %s' % url)
+    try:
+        fh = open_url(url, headers=headers)
+    except urllib2.HTTPError as e:
+        if e.code == 304 and headers:
+            logging.debug('Apt list file not modified: %s' % url)
+            return path
+        raise
+    decompressor = get_decompressor(url)
+    sha256 = hashlib.sha256()
+    with open(path + '.tmp', 'wb') as f:
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            f.write(decompressor.decompress(chunk) if decompressor else chunk)
+        if hasattr(decompressor, 'flush'):
+            f.write(decompressor.flush())
+    # never leave metadata of the previous file behind
+    remove_fetch_metadata(path)
+    os.rename(path + '.tmp', path)
+    store_fetch_metadata(path, {
+        'url': url,
+        'etag': fh.info().getheader('ETag'),
+        'last_modified': fh.info().getheader('Last-Modified'),
+        'sha256': sha256.hexdigest(),
+    })
     return path
+
+
+def get_supported_extensions():
+    """
+    Return the extensions of the compressed apt list files which can be
+    decompressed.
+    """
+    extensions = ['.gz', '.bz2']
+    if lzma is not None:
+        extensions.append('.xz')
+    return extensions
+
+
+def get_decompressor(url):
+    """
+    Return an incremental decompressor based on the extension of the url or
+    None for uncompressed files.
+    """
+    if url.endswith('.gz'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if url.endswith('.bz2'):
+        return bz2.BZ2Decompressor()
+    if url.endswith('.xz'):
+        if lzma is None:
+            raise RuntimeError('Decompressing %s requires the lzma module' % url)
+        return lzma.LZMADecompressor()
+    return None
+
+
+def get_fetch_metadata_path(path):
+    return path + '.meta'
+
+
+def load_fetch_metadata(path):
+    """
+    Load the metadata stored along with a cached apt list file.
+
+    :returns: dict, empty if no metadata is available
+    """
+    metadata_path = get_fetch_metadata_path(path)
+    if not os.path.exists(metadata_path):
+        return {}
+    try:
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        logging.warn('Ignoring invalid metadata file: %s' % metadata_path)
+        return {}
+
+
+def remove_fetch_metadata(path):
+    """
+    Remove the metadata of a cached apt list file before it is replaced.
+    """
+    try:
+        os.remove(get_fetch_metadata_path(path))
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def store_fetch_metadata(path, metadata):
+    metadata_path = get_fetch_metadata_path(path)
+    with open(metadata_path + '.tmp', 'w') as f:
+        json.dump(metadata, f)
+    os.rename(metadata_path + '.tmp', metadata_path)
+
+
+def run_concurrently(func, items, jobs=DEFAULT_FETCH_JOBS):
+    """
+    Call a function for each item using a bounded pool of threads.
+
+    :param jobs: maximum number of concurrent calls
+    :returns: generator of (item, result) tuples in the order in which the
+      calls finish
+    :raises: the first exception raised by any of the calls
+    """
+    pending = Queue.Queue()
+    for item in items:
+        pending.put(item)
+    count = pending.qsize()
+    finished = Queue.Queue()
+
+    def worker():
+        while True:
+            try:
+                item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                result = func(item)
+            except Exception as e:
+                finished.put((item, None, e))
+            else:
+                finished.put((item, result, None))
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(jobs, count)))]
+    for t in threads:
+        t.start()
+
+    for _ in range(count):
+        item, result, error = finished.get()
+        if error is not None:
+            # drop remaining calls
+            while True:
+                try:
+                    pending.get_nowait()
+                except Queue.Empty:
+                    break
+            raise error
+        yield item, result
+
+    for t in threads:
+        t.join()
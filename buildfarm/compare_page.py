@@ -10,7 +10,10 @@ from rosdistro import get_cached_distribution
 
 # Monkey-patching over some unicode bugs in empy
 # is implicitly done by importing status_page module
-from .status_page import em, get_resource_hashes
+from .status_page import em, get_resource_hashes, to_script_json
+
+# the quick filters offered on the compare page, searched for as "is:<filter>"
+QUICK_FILTERS = ['diff_patch', 'downgrade_version', 'diff_branch_same_version']
 
 
 def generate_html(index, distro_names, start_time, template_file, resource_path):
@@ -27,9 +30,14 @@ def generate_html(index, distro_names, start_time, template_file, resource_path)
             repos[repo_name] = row
 
     rows = []
+    filters = dict([(f, []) for f in QUICK_FILTERS])
     for repo_name in sorted(repos.keys()):
-        rows.append(repos[repo_name])
+        row, labels = repos[repo_name]
+        for label in labels:
+            filters[label].append(len(rows))
+        rows.append(row)
     repos = repos.keys()
+    to_json = to_script_json
 
     resource_hashes = get_resource_hashes()
 
@@ -100,6 +108,10 @@ def _is_same_version_but_different_branch(version_a, version_b, branch_a, branch
 
 
 def format_row(repo_name, distros):
+    """
+    :returns: tuple of the formatted cells and the names of the quick
+      filters matching the row or None if no versions are available
+    """
     from catkin_pkg.package import InvalidPackage, parse_package_string
     row = Row(repo_name)
     for distro in distros:
@@ -145,12 +157,8 @@ def format_row(repo_name, distros):
 
     data = [row.get_repo_name_with_link(), row.get_maintainers()] + [v if v else '' for v in row.versions]
 
-    labels = row.get_labels(distros)
-    if len(labels) > 0:
-        data[0] += ' <span class="ht">%s</span>' % ' '.join(labels)
-
     # div-wrap all cells for layout reasons
     for i, value in enumerate(data):
         data[i] = '<div>%s</div>' % value
 
-    return data
+    return data, row.get_labels(distros)
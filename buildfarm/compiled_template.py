@@ -0,0 +1,103 @@
+"""
+EmPy templates which are scanned once and can be rendered many times.
+"""
+
+import re
+import sys
+from StringIO import StringIO
+
+import em
+
+identifier_rx = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+class CompiledTemplate(object):
+    """
+    An EmPy template split into its tokens once.
+
+    Rendering only runs the tokens with the passed variables instead of
+    scanning the template text again.  The results are memoized for
+    identical values of the variables the template refers to.
+    """
+
+    def __init__(self, template, prefix=em.DEFAULT_PREFIX, max_memoized=256):
+        self.template = template
+        self.prefix = prefix
+        self._tokens = self._tokenize(template)
+        # a variable can only be used if its name occurs in the template
+        self._names = frozenset(identifier_rx.findall(template))
+        self._max_memoized = max_memoized
+        self._memo = {}
+
+    def _tokenize(self, template):
+        scanner = em.Scanner(self.prefix, template)
+        tokens = []
+        try:
+            self._scan(scanner, tokens)
+        except em.TransientParseError:
+            # same as em.Interpreter.safe(): terminate an unfinished last line
+            rest = scanner.rest()
+            if rest and rest[-1] != '\n':
+                scanner.feed(self.prefix + '\n')
+            self._scan(scanner, tokens)
+        return tokens
+
+    def _scan(self, scanner, tokens):
+        while True:
+            token = scanner.one()
+            if token is None:
+                break
+            tokens.append(token)
+
+    def render(self, variables):
+        """
+        :param variables: dict of the variables available in the template
+        :returns: the expanded template
+        """
+        key = self._get_key(variables)
+        if key is not None:
+            result = self._memo.get(key)
+            if result is not None:
+                return result
+
+        result = self._render(variables)
+
+        if key is not None:
+            if len(self._memo) >= self._max_memoized:
+                self._memo.clear()
+            self._memo[key] = result
+        return result
+
+    def _render(self, variables):
+        output = StringIO()
+        interpreter = em.Interpreter(em.NullFile())
+        old_stdout = sys.stdout
+        try:
+            interpreter.contexts.push(em.Context('<compiled template>'))
+            interpreter.streams.push(em.Stream(output))
+            # the tokens might store variables in the locals
+            locals_ = dict(variables)
+            for token in self._tokens:
+                token.run(interpreter, locals_)
+            interpreter.streams.pop().flush()
+        finally:
+            interpreter.shutdown()
+            sys.stdout = old_stdout
+        return output.getvalue()
+
+    def _get_key(self, variables):
+        try:
+            key = tuple([(k, _freeze(v)) for k, v in sorted(variables.items()) if k in self._names])
+            hash(key)
+        except TypeError:
+            # unhashable values
+            return None
+        return key
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return (list, tuple([_freeze(v) for v in value]))
+    if isinstance(value, dict):
+        return (dict, tuple([(k, _freeze(v)) for k, v in sorted(value.items())]))
+    return value
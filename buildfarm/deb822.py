@@ -0,0 +1,77 @@
+"""
+Streaming parser for Debian control-style (deb822) files such as the apt
+'Packages' and 'Sources' indices.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_lines(f, chunk_size=CHUNK_SIZE):
+    """
+    Yield the lines of a file object (without line terminators) while
+    reading it in fixed-size chunks.
+    """
+    remainder = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split('\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+    if remainder:
+        yield remainder
+
+
+def iter_stanzas(f, fields, chunk_size=CHUNK_SIZE, filter_field=None, filter_func=None):
+    """
+    Parse a deb822 file object stanza by stanza.
+
+    Only the requested fields are extracted, all other fields are skipped
+    without being stored.  Field names are matched case-sensitively.
+
+    :param f: file object opened for reading
+    :param fields: iterable of field names to extract
+    :param filter_field: name of a field which is passed to `filter_func`
+    :param filter_func: callable returning False for values of
+      `filter_field` whose stanza should be skipped without parsing the
+      remaining fields
+    :returns: generator of dicts mapping field names to values, one per
+      stanza, containing only the requested fields found in the stanza
+    """
+    fields = frozenset(fields)
+    stanza = {}
+    seen_field = False
+    skip = False
+    current = None
+    for line in iter_lines(f, chunk_size):
+        if not line.strip():
+            # blank line terminates the stanza
+            if seen_field and not skip:
+                yield stanza
+                stanza = {}
+            seen_field = False
+            skip = False
+            current = None
+            continue
+        if skip:
+            continue
+        if line[0] in ' \t':
+            # continuation line of a multi-line field
+            if current is not None:
+                stanza[current] += '\n' + line.strip()
+            continue
+        seen_field = True
+        name, sep, value = line.partition(':')
+        if sep and filter_func is not None and name == filter_field and not filter_func(value.strip()):
+            skip = True
+            stanza.clear()
+            continue
+        if sep and name in fields:
+            current = name
+            stanza[name] = value.strip()
+        else:
+            current = None
+    if seen_field and not skip:
+        yield stanza
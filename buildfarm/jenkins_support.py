@@ -30,6 +30,7 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import json
 import os
 import jenkins
 import yaml
@@ -66,6 +67,70 @@ def get_default_catkin_debs_config():
     return os.path.join(rospkg.environment.get_ros_home(), 'buildfarm', 'server.yaml')
 
 
+def get_default_job_fingerprints_file():
+    import rospkg.environment
+    return os.path.join(rospkg.environment.get_ros_home(), 'buildfarm', 'job_fingerprints.json')
+
+
+def get_default_job_snapshot_file(rosdistro):
+    import rospkg.environment
+    return os.path.join(rospkg.environment.get_ros_home(), 'buildfarm', 'job_snapshot_%s.json' % rosdistro)
+
+
+class JobFingerprints(object):
+    """
+    Local inventory of the config fingerprints of the jobs on a Jenkins
+    server as they have been configured by this machine.
+
+    The same format is used for snapshots of all jobs on the server, the
+    fingerprint of a job with an unknown config is None.
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.loaded = False
+        self._fingerprints = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                data = json.load(f)
+            # ignore inventories of other servers
+            if data.get('url') == url:
+                self._fingerprints = data.get('jobs', {})
+                self.loaded = True
+
+    def __contains__(self, job_name):
+        return job_name in self._fingerprints
+
+    def get_job_names(self):
+        return set(self._fingerprints.keys())
+
+    def get(self, job_name):
+        return self._fingerprints.get(job_name)
+
+    def set(self, job_name, fingerprint):
+        self._fingerprints[job_name] = fingerprint
+
+    def remove(self, job_name):
+        self._fingerprints.pop(job_name, None)
+
+    def prune(self, job_names):
+        """
+        Forget the fingerprints of all jobs not in `job_names`.
+        """
+        for job_name in self._fingerprints.keys():
+            if job_name not in job_names:
+                del self._fingerprints[job_name]
+
+    def save(self):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'url': self.url, 'jobs': self._fingerprints}, f, indent=1, sort_keys=True)
+        os.rename(self.path + '.tmp', self.path)
+
+
 def load_server_config_file(server_config_file):
     """
     :raises: :exc:`InvalidJenkinsConfig`
@@ -0,0 +1,204 @@
+"""
+Plan the changes to the Jenkins jobs offline and apply them later.
+
+Instead of comparing every generated config with the server the configs
+are compared with a local snapshot of the job inventory of the server.
+The resulting changeset can be reviewed and pushed in bulk afterwards.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+
+import jenkins
+
+from buildfarm.job_pool import DEFAULT_MAX_WORKERS, JobPool
+from buildfarm.release_jobs import get_config_fingerprint, get_remote_config_fingerprint, push_jenkins_job
+
+CHANGESET_FORMAT = 2
+
+
+def is_release_job(job_name, rosdistro):
+    return rosdistro in job_name and ('_sourcedeb' in job_name or '_binarydeb' in job_name)
+
+
+def update_snapshot(snapshot, jenkins_instance, rosdistro, fingerprints=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Refresh a snapshot of the release jobs of a rosdistro on the server.
+
+    The configs are only fetched for jobs whose fingerprint is not known
+    from the local inventory.
+
+    :param snapshot: :class:`buildfarm.jenkins_support.JobFingerprints`
+    :param fingerprints: :class:`buildfarm.jenkins_support.JobFingerprints`
+      inventory of the jobs configured by this machine
+    """
+    job_names = set([j['name'] for j in jenkins_instance.get_jobs()])
+    job_names = set([j for j in job_names if is_release_job(j, rosdistro)])
+    snapshot.prune(set())
+
+    remote_fingerprints = {}
+
+    def fetch_config(job_name, _):
+        config = jenkins_instance.get_job_config(job_name)
+        remote_fingerprints[job_name] = get_remote_config_fingerprint(config) or get_config_fingerprint(config)
+        return True
+
+    job_pool = JobPool(fetch_config, max_workers=max_workers)
+    try:
+        for job_name in sorted(job_names):
+            fingerprint = fingerprints.get(job_name) if fingerprints is not None else None
+            if fingerprint is not None:
+                remote_fingerprints[job_name] = fingerprint
+            else:
+                print("fetching config of job", job_name)
+                job_pool.submit(job_name, None)
+    except BaseException:
+        job_pool.cancel()
+        raise
+    finally:
+        job_pool.join()
+
+    for job_name in job_names:
+        # jobs whose config could not be fetched are considered changed
+        snapshot.set(job_name, remote_fingerprints.get(job_name))
+    print('Snapshot contains %d jobs, %d of them with unknown config' %
+          (len(job_names), len(job_names) - len(remote_fingerprints)))
+
+
+class JobPlan(object):
+    """
+    Collect the generated job configs instead of configuring the jobs.
+
+    It can be passed as the `job_pool` to :func:`buildfarm.release_jobs.doit`
+    and :func:`buildfarm.release_jobs.dry_doit`.
+    """
+
+    def __init__(self, rosdistro):
+        self.rosdistro = rosdistro
+        self._configs = {}
+        self._deleted_jobs = set()
+
+    def submit(self, job_name, config):
+        self._configs[job_name] = config
+
+    def delete(self, job_name):
+        self._deleted_jobs.add(job_name)
+
+    def update_results(self, unattempted_jobs, successful_jobs, failed_jobs):
+        # nothing is attempted while planning
+        return (unattempted_jobs, successful_jobs, failed_jobs)
+
+    def get_changeset(self, snapshot):
+        """
+        Compare the collected configs with a snapshot of the server.
+
+        :param snapshot: :class:`buildfarm.jenkins_support.JobFingerprints`
+        :returns: dict with the names of the jobs to `create`, `update`,
+          `delete` and which are `unchanged` as well as the `configs` of
+          the jobs to create or update
+        """
+        changeset = {
+            'format': CHANGESET_FORMAT,
+            'url': snapshot.url,
+            'rosdistro': self.rosdistro,
+            'create': [],
+            'update': [],
+            'delete': sorted(self._deleted_jobs),
+            'unchanged': [],
+            'configs': {},
+        }
+        for job_name in sorted(self._configs.keys()):
+            config = self._configs[job_name]
+            if job_name not in snapshot:
+                changeset['create'].append(job_name)
+            elif snapshot.get(job_name) == get_config_fingerprint(config):
+                changeset['unchanged'].append(job_name)
+                continue
+            else:
+                changeset['update'].append(job_name)
+            changeset['configs'][job_name] = config
+        return changeset
+
+
+def write_changeset(path, changeset):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(changeset, f, indent=1, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+
+def read_changeset(path):
+    with open(path) as f:
+        changeset = json.load(f)
+    if changeset.get('format') != CHANGESET_FORMAT:
+        raise RuntimeError("Changeset '%s' has unsupported format %s" % (path, changeset.get('format')))
+    return changeset
+
+
+def print_changeset(changeset):
+    print('=' * 80)
+    for action in ['create', 'update', 'delete']:
+        print('%s: %d' % (action.capitalize(), len(changeset[action])))
+        for job_name in changeset[action]:
+            print("  %s" % job_name)
+    print('Unchanged: %d' % len(changeset['unchanged']))
+    print('=' * 80)
+
+
+def apply_changeset(changeset, jenkins_instance, rosdistro, fingerprints=None, snapshot=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Push the changes of a changeset to the server.
+
+    The configs of the jobs to update are not compared with the server
+    again.  The fingerprint inventory and the snapshot are updated for
+    all successfully configured and deleted jobs.  Jobs which have
+    already been removed from the server are reported as failed but
+    removed from the inventories too.
+
+    :param snapshot: :class:`buildfarm.jenkins_support.JobFingerprints`
+      snapshot of the jobs of `rosdistro`
+    :returns: tuple of the unattempted, successful and failed jobs
+    """
+    if changeset['url'] != jenkins_instance.server:
+        raise RuntimeError("Changeset was planned for '%s' and can not be applied to '%s'" % (changeset['url'], jenkins_instance.server))
+    if changeset['rosdistro'] != rosdistro:
+        raise RuntimeError("Changeset was planned for '%s' and can not be applied to '%s'" % (changeset['rosdistro'], rosdistro))
+
+    update_jobs = set(changeset['update'])
+
+    def configure_job(job_name, config):
+        return push_jenkins_job(job_name, config, jenkins_instance, job_name in update_jobs, fingerprints)
+
+    job_names = changeset['create'] + changeset['update']
+    job_pool = JobPool(configure_job, max_workers=max_workers)
+    try:
+        for job_name in job_names:
+            job_pool.submit(job_name, changeset['configs'][job_name])
+    except BaseException:
+        job_pool.cancel()
+        raise
+    finally:
+        job_pool.join()
+    unattempted_jobs, successful_jobs, failed_jobs = job_pool.update_results(job_names, [], [])
+
+    if snapshot is not None:
+        for job_name in successful_jobs:
+            snapshot.set(job_name, get_config_fingerprint(changeset['configs'][job_name]))
+
+    for job_name in changeset['delete']:
+        try:
+            jenkins_instance.delete_job(job_name)
+        except jenkins.JenkinsException as e:
+            print('Failed to delete "%s" with error: %s' % (job_name, e), file=sys.stderr)
+            failed_jobs.append(job_name)
+            if not isinstance(e, jenkins.NotFoundException):
+                continue
+        else:
+            print('Deleted job "%s"' % job_name)
+            successful_jobs.append(job_name)
+        for inventory in [fingerprints, snapshot]:
+            if inventory is not None:
+                inventory.remove(job_name)
+    return (unattempted_jobs, successful_jobs, failed_jobs)
@@ -0,0 +1,187 @@
+"""
+Apply Jenkins job configurations concurrently.
+"""
+
+from __future__ import print_function
+
+import httplib
+import Queue
+import re
+import socket
+import sys
+import threading
+import time
+import urllib2
+
+import jenkins
+
+DEFAULT_MAX_WORKERS = 8
+
+# python-jenkins wraps URLErrors and HTTP errors 401, 403 and 500 into
+# plain JenkinsExceptions, only the message tells them apart
+_wrapped_error_rx = re.compile(r'^Error in request(: |\. Possibly authentication failed \[5\d\d\])')
+
+
+def is_transient_error(e):
+    """
+    Check if a failed request to Jenkins is worth retrying.
+    """
+    if isinstance(e, urllib2.HTTPError):
+        return e.code >= 500
+    if isinstance(e, jenkins.TimeoutException):
+        return True
+    if isinstance(e, jenkins.JenkinsException):
+        return _wrapped_error_rx.match(str(e)) is not None
+    return isinstance(e, (urllib2.URLError, socket.error, httplib.HTTPException))
+
+
+class JobPool(object):
+    """
+    Configure jobs in a pool of worker threads.
+
+    The number of requests running concurrently adapts to the server: it
+    grows by one after `increase_after` consecutive fast requests and is
+    halved whenever a request fails with a transient error or takes longer
+    than `slow_request` seconds.  Requests failing with a transient error
+    are retried up to `retries` times with an exponential backoff.
+    """
+
+    def __init__(self, func, max_workers=DEFAULT_MAX_WORKERS, min_workers=1,
+                 retries=3, retry_period=2, slow_request=10, increase_after=5):
+        """
+        :param func: callable taking a job name and a config, returning
+          True on success, False on failure and raising an exception for
+          failed requests
+        """
+        self._func = func
+        self._min_workers = min_workers
+        self._max_workers = max_workers
+        self._retries = retries
+        self._retry_period = retry_period
+        self._slow_request = slow_request
+        self._increase_after = increase_after
+
+        # current concurrency limit, start in the middle of the range
+        self.limit = max(min_workers, max_workers // 2)
+        self._active = 0
+        self._fast_requests = 0
+        self._condition = threading.Condition()
+
+        self._queue = Queue.Queue()
+        self._cancelled = threading.Event()
+        self._results = {}
+        self._threads = []
+        for _ in range(max_workers):
+            thread = threading.Thread(target=self._work)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_name, config):
+        self._queue.put((job_name, config))
+
+    def join(self):
+        """
+        Wait until all submitted jobs have been processed and stop the
+        worker threads.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        try:
+            for thread in self._threads:
+                # join with a timeout to keep the main thread interruptible
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        self._threads = []
+
+    def cancel(self):
+        """
+        Drop the submitted jobs which haven't been started yet, e.g. after
+        an error, and stop the worker threads once the running requests
+        finished.  The dropped jobs stay unattempted.
+        """
+        with self._condition:
+            self._cancelled.set()
+            self._condition.notify_all()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Queue.Empty:
+                break
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def update_results(self, unattempted_jobs, successful_jobs, failed_jobs):
+        """
+        Move the processed jobs from the unattempted jobs to the successful
+        or failed ones.
+
+        :returns: tuple of the updated lists
+        """
+        successful_jobs = successful_jobs + [j for j in unattempted_jobs if self._results.get(j) is True]
+        failed_jobs = failed_jobs + [j for j in unattempted_jobs if self._results.get(j) is False]
+        unattempted_jobs = [j for j in unattempted_jobs if j not in self._results]
+        return (unattempted_jobs, successful_jobs, failed_jobs)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            job_name, config = item
+            result = self._configure(job_name, config)
+            if result is not None:
+                with self._condition:
+                    self._results[job_name] = result
+
+    def _configure(self, job_name, config):
+        """
+        :returns: True on success, False on failure and None if the pool
+          has been cancelled before the job was attempted
+        """
+        attempt = 0
+        while True:
+            if not self._acquire():
+                return None if attempt == 0 else False
+            start = time.time()
+            try:
+                result = self._func(job_name, config)
+            except Exception as e:
+                transient = is_transient_error(e)
+                self._release(transient)
+                if not transient:
+                    print('Failed to configure "%s" with error: %s' % (job_name, e), file=sys.stderr)
+                    return False
+                if attempt >= self._retries:
+                    print('Failed to configure "%s" after %d attempts with error: %s' % (job_name, attempt + 1, e), file=sys.stderr)
+                    return False
+                print('Retrying to configure "%s" after error: %s' % (job_name, e), file=sys.stderr)
+                time.sleep(self._retry_period * 2 ** attempt)
+                attempt += 1
+                continue
+            self._release(time.time() - start > self._slow_request)
+            return bool(result)
+
+    def _acquire(self):
+        with self._condition:
+            while self._active >= self.limit and not self._cancelled.is_set():
+                self._condition.wait()
+            if self._cancelled.is_set():
+                return False
+            self._active += 1
+            return True
+
+    def _release(self, backoff):
+        with self._condition:
+            self._active -= 1
+            if backoff:
+                self.limit = max(self._min_workers, self.limit // 2)
+                self._fast_requests = 0
+            else:
+                self._fast_requests += 1
+                if self._fast_requests >= self._increase_after and self.limit < self._max_workers:
+                    self.limit += 1
+                    self._fast_requests = 0
+            self._condition.notify_all()
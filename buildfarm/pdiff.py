@@ -0,0 +1,87 @@
+"""
+Apply the ed-style patches published in 'Packages.diff' / 'Sources.diff'
+directories of apt repositories.
+"""
+
+import re
+
+ed_command_rx = re.compile(r'^(\d+)(?:,(\d+))?([acd])$')
+
+
+class PdiffError(Exception):
+    pass
+
+
+def parse_diff_index(stanza):
+    """
+    Extract the patch information from a parsed 'Index' file.
+
+    :param stanza: dict as returned by
+      :func:`buildfarm.deb822.iter_stanzas`
+    :returns: tuple of the current SHA256 and a list of
+      (sha256 before patch, patch name) tuples in the order they have to be
+      applied
+    :raises: :exc:`PdiffError` if the index does not contain SHA256 sums
+    """
+    if 'SHA256-Current' not in stanza or 'SHA256-History' not in stanza:
+        raise PdiffError('Diff index does not contain SHA256 sums')
+    current = stanza['SHA256-Current'].split()[0]
+    history = []
+    for line in stanza['SHA256-History'].splitlines():
+        parts = line.split()
+        if len(parts) == 3:
+            history.append((parts[0], parts[2]))
+    return current, history
+
+
+def get_patch_names(history, sha256):
+    """
+    Determine the patches which need to be applied to a file.
+
+    :param history: list of (sha256 before patch, patch name) tuples
+    :param sha256: SHA256 of the local file
+    :returns: list of patch names or None if the local file is not part of
+      the history
+    """
+    for i, (sha256_before, _) in enumerate(history):
+        if sha256_before == sha256:
+            return [name for _, name in history[i:]]
+    return None
+
+
+def apply_ed_script(lines, script):
+    """
+    Apply an ed script as generated by 'diff --ed' to a list of lines.
+
+    The commands are applied in the order they appear in the script which
+    is the reverse line order, so earlier commands don't shift the line
+    numbers of later ones.
+
+    :param lines: list of lines, modified in place
+    :param script: iterable of script lines without line terminators
+    :raises: :exc:`PdiffError` for unsupported commands
+    """
+    script = iter(script)
+    for command in script:
+        if not command:
+            continue
+        match = ed_command_rx.match(command)
+        if not match:
+            raise PdiffError("Unsupported ed command '%s'" % command)
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        op = match.group(3)
+        text = []
+        if op in ['a', 'c']:
+            for line in script:
+                if line == '.':
+                    break
+                text.append(line)
+            else:
+                raise PdiffError("Unterminated text for ed command '%s'" % command)
+        if op == 'a':
+            lines[start:start] = text
+        elif op == 'c':
+            lines[start - 1:end] = text
+        else:
+            del lines[start - 1:end]
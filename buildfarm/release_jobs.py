@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
-import em
 import pkg_resources
 import os
 import re
@@ -12,11 +11,13 @@ import urllib
 import urllib2
 import yaml
 import datetime
+import hashlib
 from rospkg.distro import load_distro, distro_uri
 
 from ros_distro import debianize_package_name, get_index_url
 
 from . import repo, jenkins_support
+from .compiled_template import CompiledTemplate
 
 import jenkins
 
@@ -33,9 +34,15 @@ class Templates(object):
     command_sync_binarydeb = pkg_resources.resource_string('buildfarm', 'resources/templates/dry_release/sync.sh.em')  # A config.xml template for something that runs a shell script
 
 
+_compiled_templates = {}
+
+
 def expand(config_template, d):
-    s = em.expand(config_template, **d)
-    return s
+    # the templates are only scanned once per run
+    template = _compiled_templates.get(config_template)
+    if template is None:
+        template = _compiled_templates[config_template] = CompiledTemplate(config_template)
+    return template.render(d)
 
 
 def compute_missing(distros, arches, fqdn, rosdistro, sourcedeb_only=False):
@@ -252,24 +259,118 @@ def compare_configs(a, b):
     return ET.tostring(aroot) == ET.tostring(broot)
 
 
-def create_jenkins_job(jobname, config, jenkins_instance, jenkins_jobs):
-    try:
-        print("working on job", jobname)
-        if jobname in [job['name'] for job in jenkins_jobs]:
-            remote_config = jenkins_instance.get_job_config(jobname)
-            if not compare_configs(remote_config, config):
-                jenkins_instance.reconfig_job(jobname, config)
-            else:
-                print("Skipping %s as config is the same" % jobname)
+description_rx = re.compile(r'<description>.*?</description>', re.S)
+fingerprint_rx = re.compile(r'Config fingerprint: ([0-9a-f]{64})')
 
-        else:
-            jenkins_instance.create_job(jobname, config)
-        return True
+
+def get_config_fingerprint(config):
+    """Return a hash of the config ignoring the description, matching
+    what compare_configs considers to be relevant"""
+    config = description_rx.sub('', config, 1)
+    if isinstance(config, unicode):
+        config = config.encode('utf-8')
+    return hashlib.sha256(config).hexdigest()
+
+
+def add_config_fingerprint(config, fingerprint):
+    """Append the fingerprint to the description of the config"""
+    return config.replace('</description>', ' Config fingerprint: %s</description>' % fingerprint, 1)
+
+
+def get_remote_config_fingerprint(config):
+    """Return the fingerprint stored in the description of a config or
+    None"""
+    match = description_rx.search(config)
+    if match:
+        match = fingerprint_rx.search(match.group(0))
+    return match.group(1) if match else None
+
+
+def create_jenkins_job(jobname, config, jenkins_instance, jenkins_jobs, fingerprints=None):
+    """
+    :param jenkins_jobs: set of the names of the existing jobs
+    :param fingerprints: :class:`buildfarm.jenkins_support.JobFingerprints`,
+      jobs whose config fingerprint matches the inventory are skipped
+      without contacting the server, the inventory is updated for all
+      successfully configured jobs
+    """
+    try:
+        return configure_jenkins_job(jobname, config, jenkins_instance, jenkins_jobs, fingerprints)
     except jenkins.JenkinsException as ex:
         print('Failed to configure "%s" with error: %s' % (jobname, ex), file=sys.stderr)
         return False
 
 
+def configure_jenkins_job(jobname, config, jenkins_instance, jenkins_jobs, fingerprints=None):
+    """
+    Same as :func:`create_jenkins_job` but failed requests are not caught,
+    e.g. to let a :class:`buildfarm.job_pool.JobPool` retry them.
+
+    :raises: :exc:`jenkins.JenkinsException`
+    """
+    print("working on job", jobname)
+    fingerprint = get_config_fingerprint(config)
+    config = add_config_fingerprint(config, fingerprint)
+    if jobname in jenkins_jobs:
+        if fingerprints is not None and fingerprints.get(jobname) == fingerprint:
+            print("Skipping %s as config fingerprint is the same" % jobname)
+            return True
+        remote_config = jenkins_instance.get_job_config(jobname)
+        if get_remote_config_fingerprint(remote_config) == fingerprint:
+            print("Skipping %s as config fingerprint is the same" % jobname)
+        elif not compare_configs(remote_config, config):
+            jenkins_instance.reconfig_job(jobname, config)
+        else:
+            print("Skipping %s as config is the same" % jobname)
+
+    else:
+        create_or_reconfig_job(jobname, config, jenkins_instance)
+    if fingerprints is not None:
+        fingerprints.set(jobname, fingerprint)
+    return True
+
+
+def create_or_reconfig_job(jobname, config, jenkins_instance):
+    """
+    Create a job or reconfigure it if it exists already.
+
+    A create request failing e.g. with a timeout might still have created
+    the job on the server, the existence is therefore checked again so that
+    retrying the request doesn't fail.
+
+    :raises: :exc:`jenkins.JenkinsException`
+    """
+    if jenkins_instance.job_exists(jobname):
+        jenkins_instance.reconfig_job(jobname, config)
+    else:
+        jenkins_instance.create_job(jobname, config)
+
+
+def push_jenkins_job(jobname, config, jenkins_instance, exists, fingerprints=None):
+    """
+    Create or reconfigure a job without comparing its config with the
+    server first.
+
+    Failed requests are not caught, e.g. to let a
+    :class:`buildfarm.job_pool.JobPool` retry them.
+
+    :param exists: True if the job exists on the server
+    :param fingerprints: :class:`buildfarm.jenkins_support.JobFingerprints`,
+      updated if the job is successfully configured
+    :raises: :exc:`jenkins.JenkinsException`
+    """
+    print("pushing job", jobname)
+    fingerprint = get_config_fingerprint(config)
+    config = add_config_fingerprint(config, fingerprint)
+    if exists:
+        jenkins_instance.reconfig_job(jobname, config)
+    else:
+        create_or_reconfig_job(jobname, config, jenkins_instance)
+    if fingerprints is not None:
+        fingerprints.set(jobname, fingerprint)
+    return True
+
+
 def sourcedeb_job_name(packagename):
     return "%(packagename)s_sourcedeb" % locals()
 
@@ -304,12 +405,71 @@ def binarydeb_job_name(packagename, distro, arch):
     return "%(packagename)s_binarydeb_%(distro)s_%(arch)s" % locals()
 
 
+class JobGraph(dict):
+    """
+    A dict mapping packages to the list of packages they depend on which
+    additionally provides the reverse dependencies.
+
+    The reverse index is built once on first use after the graph has been
+    modified and lists the dependents in the iteration order of the dict.
+    Only assigning or removing entries invalidates the index, so the lists
+    of dependencies must be replaced instead of being modified in place.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._dependents = None
+
+    def __setitem__(self, package, depends):
+        dict.__setitem__(self, package, depends)
+        self._dependents = None
+
+    def __delitem__(self, package):
+        dict.__delitem__(self, package)
+        self._dependents = None
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._dependents = None
+
+    def setdefault(self, package, depends=None):
+        self._dependents = None
+        return dict.setdefault(self, package, depends)
+
+    def pop(self, *args):
+        self._dependents = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._dependents = None
+        return dict.popitem(self)
+
+    def clear(self):
+        dict.clear(self)
+        self._dependents = None
+
+    def get_dependents(self, package):
+        """Return the packages which depend on the given package"""
+        if self._dependents is None:
+            dependents = {}
+            for pkg, depends in self.iteritems():
+                for dep in set(depends):
+                    dependents.setdefault(dep, []).append(pkg)
+            self._dependents = dependents
+        return self._dependents.get(package, [])
+
+
 def calc_child_jobs(packagename, distro, arch, jobgraph):
+    """
+    :param jobgraph: :class:`JobGraph`, a plain dict is accepted too but
+      its reverse index is built again on every call
+    """
     children = []
     if jobgraph:
-        for package, deps in jobgraph.iteritems():
-            if packagename in deps:
-                children.append(binarydeb_job_name(package, distro, arch))
+        if not isinstance(jobgraph, JobGraph):
+            jobgraph = JobGraph(jobgraph)
+        for package in jobgraph.get_dependents(packagename):
+            children.append(binarydeb_job_name(package, distro, arch))
     return children
 
 
@@ -413,16 +573,24 @@ def sourcedeb_job(package, maintainer_emails, distros, fqdn, release_uri, child_
     return (sourcedeb_job_name(package), create_sourcedeb_config(d))
 
 
-def dry_doit(package, dry_maintainers, distros, arches, fqdn, rosdistro, jobgraph, commit, jenkins_instance, jenkins_jobs, packages_for_sync, ssh_key_id):
-
+def dry_doit(package, dry_maintainers, distros, arches, fqdn, rosdistro, jobgraph, commit, jenkins_instance, jenkins_jobs, packages_for_sync, ssh_key_id, job_pool=None, fingerprints=None):
+    """
+    :param job_pool: :class:`buildfarm.job_pool.JobPool` or
+      :class:`buildfarm.job_plan.JobPlan`, if given the jobs are submitted
+      to it and reported as unattempted until the results are updated with
+      its `update_results` method
+    """
     jobs = dry_binarydeb_jobs(package, dry_maintainers, rosdistro, distros, arches, fqdn, jobgraph, packages_for_sync, ssh_key_id)
 
     successful_jobs = []
     failed_jobs = []
     for job_name, config in jobs:
+        if job_pool is not None:
+            job_pool.submit(job_name, config)
+            continue
         if commit:
             try:
-                ret_val = create_jenkins_job(job_name, config, jenkins_instance, jenkins_jobs)
+                ret_val = create_jenkins_job(job_name, config, jenkins_instance, jenkins_jobs, fingerprints)
                 if ret_val:
                     successful_jobs.append(job_name)
                 else:
@@ -436,7 +604,13 @@ def dry_doit(package, dry_maintainers, distros, arches, fqdn, rosdistro, jobgrap
     return (unattempted_jobs, successful_jobs, failed_jobs)
 
 
-def doit(release_uri, package_name, package, distros, arches, apt_target_repository, fqdn, job_graph, rosdistro, short_package_name, commit, jenkins_instance, jenkins_jobs, sourcedeb_timeout=None, binarydeb_timeout=None, ssh_key_id=None):
+def doit(release_uri, package_name, package, distros, arches, apt_target_repository, fqdn, job_graph, rosdistro, short_package_name, commit, jenkins_instance, jenkins_jobs, sourcedeb_timeout=None, binarydeb_timeout=None, ssh_key_id=None, job_pool=None, fingerprints=None):
+    """
+    :param job_pool: :class:`buildfarm.job_pool.JobPool` or
+      :class:`buildfarm.job_plan.JobPlan`, if given the jobs are submitted
+      to it and reported as unattempted until the results are updated with
+      its `update_results` method
+    """
     maintainer_emails = [m.email for m in package.maintainers]
     binary_jobs = binarydeb_jobs(package_name, maintainer_emails, distros, arches, apt_target_repository, fqdn, job_graph, rosdistro, short_package_name, timeout=binarydeb_timeout, ssh_key_id=ssh_key_id)
     child_projects = zip(*binary_jobs)[0]  # unzip the binary_jobs tuple
@@ -445,8 +619,11 @@ def doit(release_uri, package_name, package, distros, arches, apt_target_reposit
     successful_jobs = []
     failed_jobs = []
     for job_name, config in jobs:
+        if job_pool is not None:
+            job_pool.submit(job_name, config)
+            continue
         if commit:
-            if create_jenkins_job(job_name, config, jenkins_instance, jenkins_jobs):
+            if create_jenkins_job(job_name, config, jenkins_instance, jenkins_jobs, fingerprints):
                 successful_jobs.append(job_name)
             else:
                 failed_jobs.append(job_name)
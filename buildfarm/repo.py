@@ -36,6 +36,7 @@
 Utilities for reading state from a debian repo
 """
 
+import collections
 import urllib
 import urllib2
 import re
@@ -43,6 +44,9 @@ import os
 import tempfile
 import shutil
 import gzip
+from StringIO import StringIO
+
+from .deb822 import iter_stanzas
 
 #from .core import debianize_name
 
@@ -151,6 +155,56 @@ def load_Packages(repo_url, os_platform, arch, cache=None, source=False):
     return parse_Packages(get_Packages(repo_url, os_platform, arch, cache))
 
 
+class PackagesIndex(object):
+    """
+    Index of a debian Packages / Sources list by package name.
+    """
+
+    def __init__(self, packagelist):
+        # package name -> list of versions
+        self.versions = {}
+        # source package name -> list of binary package names
+        self.binaries = {}
+        for stanza in iter_stanzas(StringIO(packagelist), ['Package', 'Version', 'Binary']):
+            name = stanza['Package']
+            if 'Version' in stanza:
+                self.versions.setdefault(name, []).append(stanza['Version'])
+            if 'Binary' in stanza:
+                self.binaries[name] = [b.strip() for b in stanza['Binary'].split(',')]
+
+    def has_version(self, name, version, prefix=False):
+        """
+        @param version: the expected version, a trailing '.*' matches all
+        versions starting with the rest of the string
+        @param prefix: if True all versions starting with version match
+        """
+        if version.endswith('.*'):
+            version = version[:-2]
+            prefix = True
+        for v in self.versions.get(name, []):
+            if v == version or (prefix and v.startswith(version)):
+                return True
+        return False
+
+
+def get_Packages_index(repo_url, os_platform, arch, cache=None, source=False):
+    """
+    Retrieve the package list and index it by package name. The index
+    is stored in the same cache as the package list.
+    @raise BadRepo: if repo does not exist
+    """
+    if cache is None:
+        cache = _Packages_cache
+    key = ('index', repo_url, os_platform, arch if not source else 'source')
+    if key not in cache:
+        if source:
+            packagelist = get_source_Packages(repo_url, os_platform, cache)
+        else:
+            packagelist = get_Packages(repo_url, os_platform, arch, cache)
+        cache[key] = PackagesIndex(packagelist)
+    return cache[key]
+
+
 def get_repo_version(repo_url, distro, os_platform, arch, source=False):
     """
     Return the greatest build-stamp for any deb in the repository
@@ -167,45 +221,82 @@ def count_packages(repo_url, rosdistro, os_platform, arch, cache=None):
 
 def deb_in_repo(repo_url, deb_name, deb_version, os_platform, arch, use_regex=True, cache=None, source=False):
     """
+    @param deb_version: the expected version, a trailing '.*' matches all
+    versions starting with the rest of the string
+    @param use_regex: if False (and for source packages) all versions
+    starting with deb_version match
     @param cache: dictionary to store Packages list for caching
     """
-    if source:
-        packagelist = get_source_Packages(repo_url, os_platform, cache)
-        search_string = '^Package: %s\nFormat: .*\nBinary: .*\nArchitecture: .*\nVersion: %s' % (deb_name, deb_version)
-        M = re.search(search_string, packagelist, re.MULTILINE)
-        return M is not None
-    else:
-        packagelist = get_Packages(repo_url, os_platform, arch, cache)
-    if not use_regex:
-        s = 'Package: %s\nVersion: %s' % (deb_name, deb_version)
-        return s in packagelist
-    else:
-        M = re.search('^Package: %s\nVersion: %s$' % (deb_name, deb_version), packagelist, re.MULTILINE)
-        return M is not None
+    index = get_Packages_index(repo_url, os_platform, arch, cache, source)
+    return index.has_version(deb_name, deb_version, prefix=source or not use_regex)
+
+
+def get_binaries(repo_url, source_name, os_platform, cache=None):
+    """
+    Get the names of the binary packages built from a source package
+    according to the Sources list.
+    @param cache: dictionary to store Packages list for caching
+    @return: list of binary package names, empty if the source package is
+    not in the repository
+    """
+    index = get_Packages_index(repo_url, os_platform, 'na', cache, source=True)
+    return index.binaries.get(source_name, [])
+
+
+def get_reverse_depends(repo_url, os_platform, arch, cache=None):
+    """
+    Get the reverse dependencies of all packages in the Packages list.
+    The index is computed once per list and stored in the cache.
+    @return: dict mapping package names to the set of packages which
+    directly depend on them
+    """
+    if cache is None:
+        cache = _Packages_cache
+    key = ('reverse_depends', repo_url, os_platform, arch)
+    if key not in cache:
+        cache[key] = build_reverse_depends(load_Packages(repo_url, os_platform, arch, cache))
+    return cache[key]
+
+
+def build_reverse_depends(package_deps):
+    """
+    @param package_deps: (package, version, depends, distro) tuples as
+    returned by parse_Packages
+    @return: dict mapping package names to the set of packages which
+    directly depend on them
+    """
+    reverse_depends = {}
+    for package, _, deps, _ in package_deps:
+        for d in deps:
+            #strip of version specifications from deps
+            parts = d.split()
+            if parts:
+                reverse_depends.setdefault(parts[0], set()).add(package)
+    return reverse_depends
 
 
 def get_depends(repo_url, deb_name, os_platform, arch):
     """
     Get all debian package dependencies by scraping the Packages
     list. We mainly use this for invalidation logic.
+    @param deb_name: a package name or a list of package names
+    @return: list of all packages which (transitively) depend on any of
+    the packages
     """
     # There is probably something much simpler we could do, but this
     # more robust to any bad state we may have caused to the shadow
     # repo.
-    package_deps = load_Packages(repo_url, os_platform, arch)
-    queue = [deb_name]
+    reverse_depends = get_reverse_depends(repo_url, os_platform, arch)
+    if isinstance(deb_name, basestring):
+        deb_name = [deb_name]
+    queue = collections.deque(deb_name)
     depends = set()
-    # This is not particularly efficient, but it does not need to
-    # be. Basically, we find all the packages that depend on the
-    # package, then find all the packages that depends on those,
-    # etc...
+    # Find all the packages that depend on the package, then find all
+    # the packages that depends on those, etc...
     while queue:
-        next_ = queue[0]
-        queue = queue[1:]
-        for package, _, deps, _ in package_deps:
-            #strip of version specifications from deps
-            deps = [d.split()[0] for d in deps]
-            if package not in depends and next_ in deps:
+        next_ = queue.popleft()
+        for package in reverse_depends.get(next_, []):
+            if package not in depends:
                 queue.append(package)
                 depends.add(package)
     return list(depends)
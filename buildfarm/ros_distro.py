@@ -41,10 +41,12 @@ def undebianize_package_name(rosdistro, name):
 
 # todo raise not exit
 class Rosdistro:
-    def __init__(self, rosdistro_name):
+    def __init__(self, rosdistro_name, index=None):
         self._rosdistro = rosdistro_name
         self._targets = None
-        self._index = get_index(get_index_url())
+        if index is None:
+            index = get_index(get_index_url())
+        self._index = index
         if self._rosdistro not in self._index.distributions:
             print("Unknown distribution '%s'" % self._rosdistro, file=sys.stderr)
             sys.exit(1)
@@ -127,7 +129,7 @@ class Rosdistro:
 
     def get_target_distros(self):
         if self._targets is None:  # Different than empty list
-            self._targets = get_target_distros(self._rosdistro)
+            self._targets = get_target_distros(self._rosdistro, self._index)
         return self._targets
 
     def get_default_target(self):
@@ -162,8 +164,9 @@ class Rosdistro:
         return rosinstall_data
 
 
-def get_target_distros(rosdistro):
+def get_target_distros(rosdistro, index=None):
     print("Fetching targets")
-    index = get_index(get_index_url())
+    if index is None:
+        index = get_index(get_index_url())
     dist_file = get_distribution_file(index, rosdistro)
     return dist_file.release_platforms['ubuntu']
@@ -2,10 +2,14 @@
 
 from __future__ import print_function
 
+import cPickle
 import csv
+import hashlib
+import json
+import logging
+import multiprocessing
 import os
 import re
-from StringIO import StringIO
 
 # Monkey-patching over some unicode bugs in empy.
 import em
@@ -16,9 +20,17 @@ em.Stream.write = lambda self, data: em.Stream.write_old(self, data.encode('utf8
 import numpy as np
 
 from buildfarm.ros_distro import debianize_package_name
+from buildfarm.status_table import StatusRow, StringDictionary
 
 version_rx = re.compile(r'[0-9.-]+[0-9]')
 REPOS = ['building', 'shadow-fixed', 'ros/public']
+ROW_CACHE_FORMAT = 3
+PACKAGE_XML_CACHE_FORMAT = 1
+
+# the quick filters offered on the status page, searched for as "is:<filter>"
+QUICK_FILTERS = ['sync', 'regression', 'diff', 'blue', 'red', 'yellow', 'gray', 'red1', 'red2', 'red3']
+# the quick filters matching any square of a specific color
+COLOR_FILTERS = [('o', 'blue'), ('m', 'red'), ('obs', 'yellow'), ('i', 'gray')]
 
 
 def get_resource_hashes():
@@ -43,28 +55,51 @@ def get_da_strs(distro_arches):
     return output
 
 
-def get_distro_arches(arches, rosdistro):
+def get_distro_arches(arches, rosdistro, index=None):
+    """
+    :param index: the rosdistro index, fetched if not passed
+    """
     if rosdistro == 'fuerte':
         from buildfarm.ros_distro_fuerte import get_target_distros
+        distros = get_target_distros(rosdistro)
     else:
         from buildfarm.ros_distro import get_target_distros
-
-    distros = get_target_distros(rosdistro)
+        distros = get_target_distros(rosdistro, index)
     return [(d, a) for d in distros for a in arches]
 
 
+def get_debian_name_prefixes(rosdistros):
+    """
+    Return the prefixes of the debian packages considered by
+    make_versions_table or None if all packages are relevant.
+
+    :param rosdistros: name of a ros distro or list of names
+    """
+    if isinstance(rosdistros, basestring):
+        rosdistros = [rosdistros]
+    if 'backports' in rosdistros:
+        return None
+    return tuple(['ros-%s-' % rosdistro for rosdistro in rosdistros])
+
+
 def make_versions_table(rd_data, apt_data,
                         da_strs, repo_names, rosdistro):
     '''
     Returns an in-memory table with all the information that will be displayed:
     ros package names and versions followed by debian versions for each
     distro/arch.
+
+    Each distro/arch cell holds one integer per repository referring to the
+    list of distinct versions (with the suffix stripped) which is returned
+    together with the table.
     '''
     left_columns = [('name', object), ('repo', object), ('version', object), ('wet', object)]
-    right_columns = [(da_str, object) for da_str in da_strs]
+    right_columns = [(da_str, np.int32, (len(repo_names),)) for da_str in da_strs]
     columns = left_columns + right_columns
 
-    distro_debian_names = [debianize_package_name(rosdistro, pkg.name) for pkg in rd_data.packages.values()]
+    packages = rd_data.packages.values()
+    distro_debian_names = [debianize_package_name(rosdistro, pkg.name) for pkg in packages]
+    distro_debian_names_set = set(distro_debian_names)
 
     # prefixes of other ros distros
     prefixes = ['ros-electric-', 'ros-fuerte-', 'ros-unstable-']
@@ -73,81 +108,59 @@ def make_versions_table(rd_data, apt_data,
     rosdistro_prefix = 'ros-%s-' % rosdistro
     if rosdistro_prefix in prefixes:
         prefixes.remove(rosdistro_prefix)
+    prefixes = tuple(prefixes)
 
-    non_distro_debian_names = []
-    for debian_name in apt_data.debian_packages:
-        skip = False
-        # skip packages from other ros distros
-        for prefix in prefixes:
-            if debian_name.startswith(prefix):
-                skip = True
-        if skip:
-            continue
-        # skip packages which are in the rosdistro
-        if debian_name in distro_debian_names:
-            continue
-        # skip packages without prefix of this ros distro
-        if not debian_name.startswith(rosdistro_prefix):
-            continue
-        non_distro_debian_names.append(debian_name)
+    # packages with the prefix of this ros distro which are not in the rosdistro
+    non_distro_debian_names = [
+        debian_name for debian_name in apt_data.debian_packages
+        if debian_name.startswith(rosdistro_prefix) and
+        not debian_name.startswith(prefixes) and
+        debian_name not in distro_debian_names_set]
 
-    table = np.empty(len(rd_data.packages) + len(non_distro_debian_names),
-                     dtype=columns)
+    debian_names = distro_debian_names + non_distro_debian_names
+    table = np.empty(len(debian_names), dtype=columns)
 
     # add all packages coming from the distro (wet, dry, variant)
-    for i, pkg_data in enumerate(rd_data.packages.values()):
-        table['name'][i] = pkg_data.name
-        repo_name = ''
-        try:
-            repo_name = rd_data.rosdistro_dist.release_packages[pkg_data.name].repository_name
-        except KeyError:
-            pass
-        table['repo'][i] = repo_name
-        table['version'][i] = pkg_data.version
-        table['wet'][i] = pkg_data.type
-        for da_str in da_strs:
-            debian_name = debianize_package_name(rosdistro, pkg_data.name)
-            versions = get_versions(apt_data, debian_name,
-                                    repo_names, da_str)
-            table[da_str][i] = add_version_cell(versions)
-
-    i = len(rd_data.packages)
-    for debian_name in non_distro_debian_names:
-        #undebianized_pkg_name = undebianize_package_name(rosdistro, pkg_name)
-        pkg_name = debian_name
-        if pkg_name.startswith(rosdistro_prefix):
-            pkg_name = pkg_name[len(rosdistro_prefix):]
-        table['name'][i] = pkg_name
-        table['repo'][i] = ''
-        table['version'][i] = ''
-        table['wet'][i] = 'unknown'
-        all_versions = []
-        for da_str in da_strs:
-            versions = get_versions(apt_data, debian_name,
-                                    repo_names, da_str)
-            table[da_str][i] = add_version_cell(versions)
-            all_versions.extend(versions)
-        # if all version values are the same (or None) lets assume that is the expected version
-        unique_versions = set([v for v in all_versions if v != 'None'])
-        if len(unique_versions) == 1:
-            table['version'][i] = unique_versions.pop()
-        i += 1
-
-    return table
-
-
-def get_versions(apt_data, pkg_name, repo_names, da_str):
-    versions = []
-    for repo_name in repo_names:
-        v = apt_data.get_version(pkg_name, repo_name, da_str)
-        v = str(v)
-        v = strip_version_suffix(v)
-        versions.append(v)
-    return versions
-
-
-def add_version_cell(versions):
-    return '|'.join(versions)
+    # followed by the unknown packages
+    release_packages = rd_data.rosdistro_dist.release_packages
+    table['name'] = _object_array(
+        [pkg.name for pkg in packages] +
+        [debian_name[len(rosdistro_prefix):] for debian_name in non_distro_debian_names])
+    table['repo'] = _object_array(
+        [release_packages[pkg.name].repository_name if pkg.name in release_packages else '' for pkg in packages] +
+        [''] * len(non_distro_debian_names))
+    table['version'] = _object_array(
+        [pkg.version for pkg in packages] +
+        [''] * len(non_distro_debian_names))
+    table['wet'] = _object_array(
+        [pkg.type for pkg in packages] +
+        ['unknown'] * len(non_distro_debian_names))
+
+    rows = apt_data.get_rows(debian_names)
+    # each raw version is only stripped once
+    versions = StringDictionary(lambda version: strip_version_suffix(str(version)))
+    for da_str in da_strs:
+        column = table[da_str]
+        for i, repo_name in enumerate(repo_names):
+            column[:, i] = [versions.get_code(v) for v in apt_data.get_column_versions(rows, repo_name, da_str)]
+
+    # if all version values are the same (or None) lets assume that is the expected version
+    if non_distro_debian_names and da_strs:
+        none_id = versions.get_code(None)
+        unknown_cells = np.hstack([table[da_str][len(packages):] for da_str in da_strs])
+        for i, version_ids in enumerate(unknown_cells.tolist(), len(packages)):
+            unique_version_ids = set(version_ids)
+            unique_version_ids.discard(none_id)
+            if len(unique_version_ids) == 1:
+                table['version'][i] = versions.strings[unique_version_ids.pop()]
+
+    return table, versions.strings
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
 
 
 def strip_version_suffix(version):
@@ -187,8 +200,7 @@ def get_dist_arch_str(d, a):
     return "%s_%s" % (d, a)
 
 
-def render_csv(rd_data, apt_data, outfile, rosdistro,
-               distro_arches, ros_repos):
+def get_status_da_strs(distro_arches):
     distros = {}
 
     for (d, a) in distro_arches:
@@ -199,122 +211,398 @@ def render_csv(rd_data, apt_data, outfile, rosdistro,
     for d in distros:
         for a in distros[d]:
             das.append((d, a))
-    da_strs = get_da_strs(das)
+    return get_da_strs(das)
 
-    # Make an in-memory table showing the latest deb version for each package.
-    t = make_versions_table(rd_data,
-                            apt_data,
-                            da_strs,
-                            ros_repos.keys(),
-                            rosdistro)
 
+def make_status_rows(rd_data, apt_data, rosdistro, distro_arches, ros_repos):
+    """
+    Create the rows of the status page sorted by package name.
+
+    :returns: tuple of the distro/arch column names and the list of
+      :class:`StatusRow` instances
+    """
+    da_strs = get_status_da_strs(distro_arches)
+
+    # Make an in-memory table showing the latest deb version for each package.
+    t, versions = make_versions_table(rd_data,
+                                      apt_data,
+                                      da_strs,
+                                      ros_repos.keys(),
+                                      rosdistro)
+
+    # decode the version ids column by column
+    versions = _object_array(versions)
+    columns = [[tuple(c) for c in versions[t[da_str]].tolist()] for da_str in da_strs]
+    rows = [StatusRow(name, repo, version, type_, list(cells))
+            for name, repo, version, type_, cells in zip(
+                t['name'], t['repo'], t['version'], t['wet'], zip(*columns) if columns else [()] * len(t))]
+    rows.sort(key=lambda row: row.name)
+    return da_strs, rows
+
+
+def write_csv(da_strs, rows, outfile):
     with open(outfile, 'w') as fh:
-        # Output CSV from the in-memory table
         w = csv.writer(fh)
-        w.writerow(t.dtype.names)
-        for row in t:
-            w.writerow(row)
+        w.writerow(['name', 'repo', 'version', 'wet'] + da_strs)
+        for row in rows:
+            w.writerow(row.to_csv_row())
+
 
+def read_csv(data_source):
+    """
+    Read the rows of the status page from a .csv file.
 
-def transform_csv_to_html(data_source, metadata_builder,
-                          rosdistro, start_time, template_file, resource_path, cached_distribution=None):
+    :returns: tuple of the distro/arch column names and the list of
+      :class:`StatusRow` instances sorted by package name
+    """
     reader = csv.reader(data_source, delimiter=',', quotechar='"')
-    rows = [row for row in reader]
+    headers = next(reader)
+    rows = [StatusRow.from_csv_row(row) for row in reader]
+    rows.sort(key=lambda row: row.name)
+    return headers[4:], rows
 
-    headers = rows[0]
-    rows = rows[1:]
 
-    metadata_columns = [None] * 4 + [metadata_builder(c) for c in headers[4:]]
+def write_html(output, da_strs, status_rows, metadata_builder,
+               rosdistro, start_time, template_file, resource_path, package_infos,
+               row_cache=None):
+    """
+    Render the status page into a file object.
+
+    Each row is formatted while the template is being expanded and written
+    to the output immediately, so the formatted rows are never held in
+    memory all at once.  The rows are embedded as a JSON array of cells
+    which the page renders on demand, followed by the indices of the rows
+    matching each of the quick filters.
+
+    :param package_infos: dict as returned by :func:`get_package_infos`
+    :param row_cache: dict of previously formatted rows as returned by
+      :func:`load_row_cache`, only rows whose inputs changed are formatted
+      again and the dict is updated with those
+    """
+    metadata_columns = [None] * 4 + [metadata_builder(c) for c in da_strs]
+    headers = ['name', 'repo', 'version', 'wet'] + da_strs
     headers = [format_header_cell(headers[i], metadata_columns[i])
                for i in range(len(headers))]
 
     # count non-None rows per (sub-)column
-    row_counts = [[]] * 4 + [[0] * 3 for _ in range(4, len(headers))]
-    for row in rows:
-        for i in range(4, len(row_counts)):
-            versions = get_cell_versions(row[i])
-            for j in range(0, len(versions)):
-                if versions[j] != 'None':
-                    row_counts[i][j] += 1
-
-    def get_package_name_from_row(row):
-        return row[0]
-    rows = sorted(rows, key=get_package_name_from_row)
-    rows = [format_row(r, metadata_columns) for r in rows]
-    inject_status_and_maintainer(cached_distribution, headers, row_counts, rows)
-
-    # div-wrap the first three cells for layout reasons. It's difficult to contrain the
-    # overall dimensions of a table cell without an inner element to use as the overflow
-    # container.
-    for row in rows:
-        for i in range(3):
-            row[i] = "<div>%s</div>" % row[i]
+    row_counts = [[]] * 4 + [[0] * 3 for _ in da_strs]
+    for status_row in status_rows:
+        for counts, versions in zip(row_counts[4:], status_row.cells):
+            for j, version in enumerate(versions):
+                if version != 'None':
+                    counts[j] += 1
+
+    headers[4:4] = ['Status', 'Maintainer']
+    row_counts[4:4] = [[], []]
+
+    # filled while the rows are being formatted
+    filters = dict([(f, []) for f in QUICK_FILTERS])
+    rows = iter_formatted_rows(status_rows, metadata_columns, package_infos, row_cache, filters)
 
     repos = REPOS
+    to_json = to_script_json
 
     resource_hashes = get_resource_hashes()
 
-    output = StringIO()
     try:
-        interpreter = em.Interpreter(output=output)
+        # the interpreter closes its output on shutdown
+        interpreter = em.Interpreter(output=_UnclosedStream(output))
         interpreter.file(open(template_file), locals=locals())
-        return output.getvalue()
     finally:
         interpreter.shutdown()
 
 
-def inject_status_and_maintainer(cached_distribution, header, counts, rows):
-    from catkin_pkg.package import InvalidPackage, parse_package_string
-    header[4:4] = ['Status', 'Maintainer']
-    counts[4:4] = [[], []]
-    for row in rows:
-        status_cell = ''
-        maintainer_cell = '<a>?</a>'
-        # Use website url if defined, otherwise default to ros wiki
-        pkg_name = row[0].split(' ')[0]
-        url = 'http://wiki.ros.org/%s' % pkg_name
-        repo_name = row[1]
+def to_script_json(value):
+    """
+    Serialize a value to JSON which can be embedded in a <script> element.
+    """
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+class _UnclosedStream(object):
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, data):
+        self._stream.write(data)
+
+    def flush(self):
+        self._stream.flush()
+
+    def close(self):
+        self._stream.flush()
+
+
+def iter_formatted_rows(status_rows, metadata_columns, package_infos=None, row_cache=None,
+                        filters=None):
+    """
+    Format the rows of the status page one by one.
+
+    :param package_infos: dict mapping package names to
+      :class:`PackageInfo` instances as returned by
+      :func:`get_package_infos`
+
+    :param row_cache: dict mapping package names to tuples of the row
+      inputs, the formatted row and its quick filters, rows with unchanged
+      inputs are reused and the dict is updated with newly formatted rows
+    :param filters: dict mapping the names of the quick filters to lists,
+      the index of each yielded row is appended to the lists of the
+      filters it matches
+    :returns: generator of formatted rows
+    """
+    if package_infos is None:
+        package_infos = {}
+    if row_cache is None:
+        row_cache = {}
+    updated = 0
+    for index, status_row in enumerate(status_rows):
+        package_info = package_infos.get(status_row.name)
+        key = get_row_inputs(package_info, status_row)
+        cached = row_cache.get(status_row.name)
+        if cached is not None and cached[0] == key:
+            _, row, row_filters = cached
+        else:
+            row, row_filters = format_row(status_row, metadata_columns)
+            inject_status_and_maintainer(package_info, row, status_row)
+
+            # div-wrap the first three cells for layout reasons. It's difficult to contrain the
+            # overall dimensions of a table cell without an inner element to use as the overflow
+            # container.
+            for i in range(3):
+                row[i] = "<div>%s</div>" % row[i]
+            row_cache[status_row.name] = (key, row, row_filters)
+            updated += 1
+        if filters is not None:
+            for f in row_filters:
+                filters[f].append(index)
+        yield row
+    logging.debug('Formatted %d of %d rows' % (updated, len(status_rows)))
+
+
+def get_row_inputs(package_info, status_row):
+    """
+    Collect all information a formatted row depends on.
+
+    :returns: a tuple which is equal between runs as long as the formatted
+      row doesn't change
+    """
+    inputs = (status_row.name, status_row.repo, status_row.version, status_row.type, tuple(status_row.cells))
+    if package_info is not None:
+        inputs += package_info.get_key()
+    return inputs
+
+
+def load_row_cache(path, da_strs):
+    """
+    Load the formatted rows of a previous run.
+
+    :returns: dict mapping package names to tuples of row inputs,
+      formatted rows and quick filters, empty if the cache is missing or the columns changed
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            cache_format, cache_da_strs, row_cache = cPickle.load(f)
+    except Exception as e:
+        logging.warn('Ignoring invalid row cache %s: %s' % (path, e))
+        return {}
+    if cache_format != ROW_CACHE_FORMAT or cache_da_strs != da_strs:
+        return {}
+    return row_cache
+
+
+def save_row_cache(path, da_strs, row_cache, status_rows):
+    """
+    Store the formatted rows of the current status rows.
+    """
+    names = set([r.name for r in status_rows])
+    row_cache = dict([(k, v) for k, v in row_cache.iteritems() if k in names])
+    with open(path + '.tmp', 'wb') as f:
+        cPickle.dump((ROW_CACHE_FORMAT, da_strs, row_cache), f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
+
+
+class PackageInfo(object):
+    """
+    The information of a wet package shown in the meta columns of its row.
+    """
+
+    def __init__(self, status, status_description, package_xml_sha256, package_xml_data,
+                 repo_url, repo_version):
+        self.status = status
+        self.status_description = status_description
+        self.package_xml_sha256 = package_xml_sha256
+        # None if the package.xml is not available,
+        # otherwise as returned by parse_package_xml()
+        self.package_xml_data = package_xml_data
+        self.repo_url = repo_url
+        self.repo_version = repo_version
+
+    def get_key(self):
+        return (self.status, self.status_description, self.package_xml_sha256,
+                self.repo_url, self.repo_version)
+
+
+def get_package_infos(cached_distribution, status_rows, package_xml_cache=None, jobs=1):
+    """
+    Resolve the status, maintainers and website url of all wet packages.
+
+    The package.xml files are parsed in a pool of `jobs` processes.
+
+    :param package_xml_cache: dict mapping the SHA256 of package.xml files
+      to the data returned by :func:`parse_package_xml` as returned by
+      :func:`load_package_xml_cache`, only package.xml files which are not
+      in the cache are parsed and the dict is updated with those
+    :returns: dict mapping package names to :class:`PackageInfo` instances
+    """
+    if package_xml_cache is None:
+        package_xml_cache = {}
+    if not cached_distribution:
+        return {}
+
+    infos = {}
+    package_xmls = {}
+    for status_row in status_rows:
+        if status_row.type != 'wet':
+            continue
+        pkg = cached_distribution.release_packages[status_row.name]
+        repo = cached_distribution.repositories[pkg.repository_name]
+        status = 'unknown'
+        if pkg.status is not None:
+            status = pkg.status
+        elif repo.status is not None:
+            status = repo.status
+        status_description = ''
+        if pkg.status_description is not None:
+            status_description = pkg.status_description
+        elif repo.status_description is not None:
+            status_description = repo.status_description
+        pkg_xml = cached_distribution.get_release_package_xml(status_row.name)
+        sha256 = None
+        if pkg_xml is not None:
+            if isinstance(pkg_xml, unicode):
+                pkg_xml = pkg_xml.encode('utf8')
+            sha256 = hashlib.sha256(pkg_xml).hexdigest()
+            if sha256 not in package_xml_cache:
+                package_xmls[sha256] = pkg_xml
         repo_url = None
         repo_version = None
-        if row[3] == 'wet' and cached_distribution:
-            pkg = cached_distribution.release_packages[pkg_name]
-            repo = cached_distribution.repositories[pkg.repository_name]
-            status = 'unknown'
-            if pkg.status is not None:
-                status = pkg.status
-            elif repo.status is not None:
-                status = repo.status
-            status_description = ''
-            if pkg.status_description is not None:
-                status_description = pkg.status_description
-            elif repo.status_description is not None:
-                status_description = repo.status_description
-            status_cell = '<a class="%s"%s/>' % (status, ' title="%s"' % status_description if status_description else '')
-            pkg_xml = cached_distribution.get_release_package_xml(pkg_name)
-            if pkg_xml is not None:
-                try:
-                    pkg = parse_package_string(pkg_xml)
-                    maintainer_cell = ''.join(['<a href="mailto:%s">%s</a>' % (m.email, m.name) for m in pkg.maintainers])
-                    for u in pkg['urls']:
-                        if u.type == 'website':
-                            url = u
-                            break
-                except InvalidPackage:
-                    maintainer_cell = '<a><b>bad package.xml</b></a>'
-            if repo.source_repository:
-                repo_url = repo.source_repository.url
-                repo_version = repo.source_repository.version
-            elif repo.doc_repository:
-                repo_url = repo.doc_repository.url
-                repo_version = repo.doc_repository.version
+        if repo.source_repository:
+            repo_url = repo.source_repository.url
+            repo_version = repo.source_repository.version
+        elif repo.doc_repository:
+            repo_url = repo.doc_repository.url
+            repo_version = repo.doc_repository.version
+        infos[status_row.name] = PackageInfo(
+            status, status_description, sha256, None, repo_url, repo_version)
+
+    if package_xmls:
+        sha256s = package_xmls.keys()
+        pkg_xmls = [package_xmls[sha256] for sha256 in sha256s]
+        if jobs > 1 and len(pkg_xmls) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(pkg_xmls)))
+            try:
+                results = pool.map(parse_package_xml, pkg_xmls)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            status_cell = '<a class="unknown"/>'
-        row[0] = row[0].replace(pkg_name, '<a href="%s">%s</a>' % (url, pkg_name), 1)
-        if repo_url:
-            if repo_url.startswith('https://github.com/') and repo_url.endswith('.git') and repo_version:
-                repo_url = '%s/tree/%s' % (repo_url[:-4], repo_version)
-            row[1] = '<a href="%s">%s</a>' % (repo_url, repo_name)
-        row[4:4] = [status_cell, maintainer_cell]
+            results = map(parse_package_xml, pkg_xmls)
+        package_xml_cache.update(zip(sha256s, results))
+    logging.debug('Parsed %d package.xml files' % len(package_xmls))
+
+    for info in infos.values():
+        if info.package_xml_sha256 is not None:
+            info.package_xml_data = package_xml_cache[info.package_xml_sha256]
+    return infos
+
+
+def parse_package_xml(pkg_xml):
+    """
+    Extract the information shown on the status page from a package.xml.
+
+    :returns: None if the package.xml is invalid, otherwise a tuple of the
+      list of (email, name) tuples of the maintainers and the website url
+      (or None)
+    """
+    from catkin_pkg.package import InvalidPackage, parse_package_string
+    try:
+        pkg = parse_package_string(pkg_xml)
+    except InvalidPackage:
+        return None
+    maintainers = [(m.email, m.name) for m in pkg.maintainers]
+    url = None
+    for u in pkg['urls']:
+        if u.type == 'website':
+            url = u.url
+            break
+    return maintainers, url
+
+
+def load_package_xml_cache(path):
+    """
+    Load the parsed package.xml files of a previous run.
+
+    :returns: dict mapping the SHA256 of package.xml files to the data
+      returned by :func:`parse_package_xml`, empty if the cache is missing
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            cache_format, package_xml_cache = cPickle.load(f)
+    except Exception as e:
+        logging.warn('Ignoring invalid package.xml cache %s: %s' % (path, e))
+        return {}
+    if cache_format != PACKAGE_XML_CACHE_FORMAT:
+        return {}
+    return package_xml_cache
+
+
+def save_package_xml_cache(path, package_xml_cache, package_infos):
+    """
+    Store the parsed package.xml files of the current packages.
+    """
+    sha256s = set([i.package_xml_sha256 for i in package_infos.values()])
+    package_xml_cache = dict([(k, v) for k, v in package_xml_cache.iteritems() if k in sha256s])
+    with open(path + '.tmp', 'wb') as f:
+        cPickle.dump((PACKAGE_XML_CACHE_FORMAT, package_xml_cache), f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
+
+
+def inject_status_and_maintainer(package_info, row, status_row):
+    status_cell = ''
+    maintainer_cell = '<a>?</a>'
+    # Use website url if defined, otherwise default to ros wiki
+    pkg_name = status_row.name
+    url = 'http://wiki.ros.org/%s' % pkg_name
+    repo_name = status_row.repo
+    repo_url = None
+    repo_version = None
+    if status_row.type == 'wet' and package_info is not None:
+        status = package_info.status
+        status_description = package_info.status_description
+        status_cell = '<a class="%s"%s/>' % (status, ' title="%s"' % status_description if status_description else '')
+        if package_info.package_xml_sha256 is not None:
+            if package_info.package_xml_data is not None:
+                maintainers, website_url = package_info.package_xml_data
+                maintainer_cell = ''.join(['<a href="mailto:%s">%s</a>' % m for m in maintainers])
+                if website_url is not None:
+                    url = website_url
+            else:
+                maintainer_cell = '<a><b>bad package.xml</b></a>'
+        repo_url = package_info.repo_url
+        repo_version = package_info.repo_version
+    else:
+        status_cell = '<a class="unknown"/>'
+    row[0] = row[0].replace(pkg_name, '<a href="%s">%s</a>' % (url, pkg_name), 1)
+    if repo_url:
+        if repo_url.startswith('https://github.com/') and repo_url.endswith('.git') and repo_version:
+            repo_url = '%s/tree/%s' % (repo_url[:-4], repo_version)
+        row[1] = '<a href="%s">%s</a>' % (repo_url, repo_name)
+    row[4:4] = [status_cell, maintainer_cell]
 
 
 def format_header_cell(cell, metadata):
@@ -325,36 +613,46 @@ def format_header_cell(cell, metadata):
     return cell
 
 
-def format_row(row, metadata_columns):
-    public_changing_on_sync = [False] * 4 + \
-        [is_public_changing_on_sync(c) for c in row[4:]]
-    regression = [False] * 4 + \
-        [is_regression(c) for c in row[4:]]
+def format_row(status_row, metadata_columns):
+    """
+    Format the cells of a status row.
+
+    :returns: tuple of the list of formatted cells and the list of quick
+      filters matching the row
+    """
+    public_changing_on_sync = [is_public_changing_on_sync(c) for c in status_row.cells]
+    regression = [is_regression(c) for c in status_row.cells]
     # Flag if this is dry or a variant so as not to show sourcedebs as red
-    no_source = row[3] in ['variant', 'dry']
+    no_source = status_row.type in ['variant', 'dry']
     # ignore source columns for dry/variant when deciding of columns are homogeneous
-    diff_columns = [c for i, c in enumerate(row) if i > 3 and (not no_source or i % 3 - 1)]
+    metadata = metadata_columns[4:]
+    diff_columns = [c for c, md in zip(status_row.cells, metadata) if not no_source or not md['is_source']]
     has_diff_between_rosdistros = len(set(diff_columns)) > 1
 
-    # urls for each building repository column
-    metadata = [None] * 4 + [md for md in metadata_columns[4:]]
     # for unknown packages the latest version number is only a guess so don't mark missing cells
-    latest_version = row[2] if row[3] != 'unknown' else None
-    # only pass no_source if this is a sourcedeb entry
-    row = row[:4] + [format_versions_cell(get_cell_versions(row[i]),
-                                          latest_version,
-                                          no_source and metadata[i]['is_source'])
-                     for i in range(4, len(row))]
-
-    hidden_texts = []
-    if has_diff_between_rosdistros:
-        hidden_texts.append('diff')
+    latest_version = status_row.version if status_row.type != 'unknown' else None
+    # no package is expected in sourcedeb columns of dry/variant entries
+    cell_latest_versions = [latest_version if not no_source or not md['is_source'] else None
+                            for md in metadata]
+    colors = [[get_version_color(v, latest) for v in versions]
+              for versions, latest in zip(status_row.cells, cell_latest_versions)]
+    row = [status_row.name, status_row.repo, status_row.version, status_row.type] + \
+        [format_versions_cell(versions, latest, cell_colors)
+         for versions, latest, cell_colors in zip(status_row.cells, cell_latest_versions, colors)]
+
+    filters = []
     if True in public_changing_on_sync:
-        hidden_texts.append('sync')
+        filters.append('sync')
     if True in regression:
-        hidden_texts.append('regression')
-    if len(hidden_texts) > 0:
-        row[0] += ' <span class="ht">%s</span>' % ' '.join(hidden_texts)
+        filters.append('regression')
+    if has_diff_between_rosdistros:
+        filters.append('diff')
+    all_colors = set([c for cell_colors in colors for c in cell_colors])
+    filters += [f for c, f in COLOR_FILTERS if c in all_colors]
+    # missing packages per repository
+    for i in range(3):
+        if 'm' in [cell_colors[i] for cell_colors in colors]:
+            filters.append('red%d' % (i + 1))
 
     type_texts = {
         'wet': 'wet',
@@ -363,16 +661,14 @@ def format_row(row, metadata_columns):
         'variant': "var"
     }
     row[3] = type_texts[row[3]]
-    return row
+    return row, filters
 
 
-def is_public_changing_on_sync(cell):
-    versions = get_cell_versions(cell)
+def is_public_changing_on_sync(versions):
     return versions[1] != versions[2]
 
 
-def is_regression(cell):
-    versions = get_cell_versions(cell)
+def is_regression(versions):
     public_version = versions[-1]
     if public_version != "None":
         public_version_parts = [int(y) for x in public_version.split('.') for y in x.split('-')]
@@ -386,34 +682,26 @@ def is_regression(cell):
     return False
 
 
-def get_cell_versions(cell):
-    return cell.split('|')
-
-
-def format_versions_cell(versions, latest_version,
-                         no_source=False):
-    # set the latest_version to None if no package expected
-    if no_source:
-        latest_version = None
-    cell = ''.join([format_version(v, latest_version) for v in versions])
-
-    return cell
+def format_versions_cell(versions, latest_version, colors):
+    return ''.join([format_version(v, latest_version, c) for v, c in zip(versions, colors)])
 
 
-def format_version(version, latest):
+def get_version_color(version, latest):
     if latest:
         if not version or version == 'None':
-            color = 'm'  # missing
+            return 'm'  # missing
         elif version == latest:
-            color = None  # latest
+            return None  # latest
         else:
-            color = 'o'  # outdated
+            return 'o'  # outdated
     else:
         if not version or version == 'None':
-            color = 'i'  # ignore
+            return 'i'  # ignore
         else:
-            color = 'obs'  # obsolete
+            return 'obs'  # obsolete
+
 
+def format_version(version, latest, color):
     label = version
     if version == latest:
         # When version is the same as latest, Javascript will infer it. This
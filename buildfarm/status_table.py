@@ -0,0 +1,187 @@
+"""
+Compact binary storage of the status rows.
+
+The file starts with a short header containing the column names and the
+dictionary of all distinct strings, followed by a matrix of integer codes
+(one row per package) referring to that dictionary.  Each distinct name,
+version etc. is stored only once and the matrix can be memory-mapped, so
+single packages can be looked up without decoding the whole table.
+
+The module only depends on numpy so that other tools can read the table
+without the dependencies of the status page.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = 'BFST'
+FORMAT_VERSION = 1
+CODE_DTYPE = np.dtype('<u4')
+META_COLUMNS = ['name', 'repo', 'version', 'wet']
+
+_header_struct = struct.Struct('<4sII')
+
+
+class StatusRow(object):
+    """
+    A row of the status page with the versions of each distro/arch column
+    already split per repository.
+    """
+
+    def __init__(self, name, repo, version, type_, cells):
+        self.name = name
+        self.repo = repo
+        self.version = version
+        self.type = type_
+        # one tuple of versions (building, shadow-fixed, public) per column
+        self.cells = cells
+
+    def to_csv_row(self):
+        return [self.name, self.repo, self.version, self.type] + \
+            ['|'.join(versions) for versions in self.cells]
+
+    @classmethod
+    def from_csv_row(cls, row):
+        return cls(row[0], row[1], row[2], row[3],
+                   [tuple(c.split('|')) for c in row[4:]])
+
+
+class StringDictionary(object):
+    """
+    Assign integer codes to distinct strings.
+
+    If a `normalize` function is passed the values are normalized before
+    being encoded, each distinct value is only normalized once.
+    """
+
+    def __init__(self, normalize=None):
+        self.strings = []
+        self._codes = {}
+        self._normalize = normalize
+        self._value_codes = {} if normalize is not None else self._codes
+
+    def get_code(self, value):
+        try:
+            return self._value_codes[value]
+        except KeyError:
+            pass
+        string = self._normalize(value) if self._normalize is not None else value
+        code = self._codes.get(string)
+        if code is None:
+            code = self._codes[string] = len(self.strings)
+            self.strings.append(string)
+        self._value_codes[value] = code
+        return code
+
+
+def write_status_table(da_strs, rows, path):
+    """
+    Store the status rows in a binary status table file.
+
+    :param rows: list of :class:`StatusRow` instances
+    """
+    repos_per_cell = len(rows[0].cells[0]) if rows and rows[0].cells else 0
+    strings = StringDictionary()
+    width = len(META_COLUMNS) + len(da_strs) * repos_per_cell
+    codes = np.empty((len(rows), width), dtype=CODE_DTYPE)
+    for i, row in enumerate(rows):
+        values = [row.name, row.repo, row.version, row.type]
+        for versions in row.cells:
+            values.extend(versions)
+        codes[i] = [strings.get_code(v) for v in values]
+
+    header = json.dumps({
+        'da_strs': da_strs,
+        'repos_per_cell': repos_per_cell,
+        'rows': len(rows),
+        'strings': [s.decode('utf-8') if isinstance(s, str) else s for s in strings.strings],
+    })
+    # align the matrix for memory-mapping
+    header += ' ' * (-(_header_struct.size + len(header)) % CODE_DTYPE.itemsize)
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(_header_struct.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(codes.tostring())
+    os.rename(path + '.tmp', path)
+
+
+class StatusTable(object):
+    """
+    Read access to a binary status table file.
+
+    The codes are memory-mapped and only decoded on demand.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, format_version, header_length = _header_struct.unpack(f.read(_header_struct.size))
+            if magic != MAGIC:
+                raise RuntimeError("File '%s' is not a status table" % path)
+            if format_version != FORMAT_VERSION:
+                raise RuntimeError("Status table '%s' has unsupported format version %d" % (path, format_version))
+            header = json.loads(f.read(header_length))
+        self.da_strs = [str(da_str) for da_str in header['da_strs']]
+        self.repos_per_cell = header['repos_per_cell']
+        self.strings = [s.encode('utf-8') for s in header['strings']]
+        width = len(META_COLUMNS) + len(self.da_strs) * self.repos_per_cell
+        if header['rows']:
+            self.codes = np.memmap(path, dtype=CODE_DTYPE, mode='r',
+                                   offset=_header_struct.size + header_length,
+                                   shape=(header['rows'], width))
+        else:
+            self.codes = np.empty((0, width), dtype=CODE_DTYPE)
+        self._row_indices = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def get_row_index(self, name):
+        """
+        :returns: the index of the row of a package or None
+        """
+        if self._row_indices is None:
+            strings = self.strings
+            self._row_indices = dict([(strings[code], i) for i, code in enumerate(self.codes[:, 0])])
+        return self._row_indices.get(name)
+
+    def get_status_row(self, index):
+        return self._make_status_row([self.strings[code] for code in self.codes[index]])
+
+    def get_status_rows(self):
+        # decode all codes at once
+        strings = np.empty(len(self.strings), dtype=object)
+        strings[:] = self.strings
+        return [self._make_status_row(values) for values in strings[self.codes].tolist()]
+
+    def _make_status_row(self, values):
+        n = self.repos_per_cell
+        cells = [tuple(values[i:i + n]) for i in range(len(META_COLUMNS), len(values), n)]
+        return StatusRow(values[0], values[1], values[2], values[3], cells)
+
+    def get_versions(self, name, da_str):
+        """
+        Look up the versions of a single package in one distro/arch column.
+
+        :returns: tuple of versions (one per repository) or None if the
+          package is unknown
+        """
+        index = self.get_row_index(name)
+        if index is None:
+            return None
+        start = len(META_COLUMNS) + self.da_strs.index(da_str) * self.repos_per_cell
+        return tuple([self.strings[code] for code in self.codes[index, start:start + self.repos_per_cell]])
+
+
+def read_status_table(path):
+    """
+    Read the rows of the status page from a binary status table file.
+
+    :returns: tuple of the distro/arch column names and the list of
+      :class:`StatusRow` instances
+    """
+    table = StatusTable(path)
+    return table.da_strs, table.get_status_rows()
@@ -28,9 +28,9 @@ import time
       <input type="text" name="q" id="q" />
       <p>Quick:
         <a href="?q=" title="Show all repos">all</a>,
-        <a href="?q=diff_patch" title="Filter packages which are only differ in the patch version">different patch version</a>,
-        <a href="?q=downgrade_version" title="Filter packages which disappear by a sync from shadow-fixed to public">downgrade</a>,
-        <a href="?q=diff_branch_same_version" title="Filter packages which are are released from different branches but have same minor version">same version from different branches</a>,
+        <a href="?q=is:diff_patch" title="Filter packages which are only differ in the patch version">different patch version</a>,
+        <a href="?q=is:downgrade_version" title="Filter packages which disappear by a sync from shadow-fixed to public">downgrade</a>,
+        <a href="?q=is:diff_branch_same_version" title="Filter packages which are are released from different branches but have same minor version">same version from different branches</a>,
       </p>
       <p id="search-count"></p>
     </form>
@@ -45,11 +45,16 @@ import time
     </thead>
     <tbody>
       <script type="text/javascript">window.tbody_ready();</script>
-@[for row in rows]@
-      <tr>@[for cell in row]<td>@(cell)</td>@[end for]</tr>
-@[end for]@
     </tbody>
   </table>
+  <script type="text/javascript">
+    window.ROWS = [
+@[for row in rows]@
+@(to_json(row)),
+@[end for]@
+    ];
+    window.FILTERS = @(to_json(filters));
+  </script>
 </body>
 <script type="text/javascript">window.body_done();</script>
 </html>
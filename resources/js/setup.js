@@ -1,12 +1,8 @@
-var QUERY_TRANSFORMS = {
-  'blue': 'class="o"',
-  'red': '<a class="m"></a>',
-  'yellow': 'class="obs"',
-  'gray': '<a class="i"></a>',
-  'red1': '<td><a class="m"></a>',
-  'red2': '</a><a class="m"></a><a',
-  'red3': '<a class="m"></a></td>'
-};
+// Number of rows rendered above and below the visible part of the table.
+var RENDER_MARGIN = 20;
+
+// Prefix of the terms referring to the quick filters, it can't be part of a package name.
+var FILTER_PREFIX = 'is:';
 
 window.body_ready = function() {
   var url_parts = window.location.href.split('?');
@@ -153,142 +149,134 @@ window.tbody_ready = function() {
     filter_table();
   });
 
-  /* If there is a load-time query string which will trigger an immediate
-   * filter, hide the in-progress loading of the table. Deliberately do this
-   * after the header cloning dingus above, so that the header dimensions are
-   * correct. */
-  if (window.queries || window.sort) {
-    $('tbody').css('visibility', 'hidden');
-    setTimeout(function() {
-      $('tbody').css('visibility', 'visible');
-      if (!$('tbody').data('body_done')) {
-        $('tbody').hide();
-      }
-    }, 0);
-  }
 };
 
 window.body_done = function() {
-  if (window.queries || window.sort) {
-    filter_table();
-  } else {
-    var count = $('tbody tr').length;
-    $("#search-count").text("showing " + count + " of " + count + " total");
-  }
+  prepare_rows();
+  rewrite_legacy_filters();
+  filter_table();
   $('tbody').show();
   $('tbody').data('body_done', true);
+  $(window).on('scroll resize', function() {
+    window.render_timeout || (window.render_timeout = setTimeout(function() {
+      window.render_timeout = null;
+      render_rows();
+    }, 0));
+  });
 }
 
-function scan_rows() {
-  // TODO: Potentially could make the initial load/search more responsive by having this
-  // go in chunks, with timeouts in between.
-  window.rows = [];
-  $('table tbody tr').each(function() {
-    // Add lowercased version of name (which is the last meta column) for faster case-insensitive search.
-    var name_td = $('td:nth-child(' + window.META_COLUMNS + ')', this);
-    if (name_td.text() && name_td.text().length > 0) {
-      name_td.append(' <span class="ht">' + name_td.text().toLowerCase() + '</span>');
+function prepare_rows() {
+  // Derive the markup and the searchable and sortable text of the meta columns from the row data once.
+  window.row_html = [];
+  window.row_texts = [];
+  window.row_search = [];
+  $.each(window.ROWS, function(i, row) {
+    window.row_html.push('<td>' + row.join('</td><td>') + '</td>');
+    var texts = [];
+    for (var j = 0; j < window.META_COLUMNS; j++) {
+      var text = row[j].replace(/<[^>]*>/g, '');
+      texts.push(text || row[j]);
     }
-    var row_info = [$(this).html()];
-    for (var i = 1; i <= window.META_COLUMNS; i++) {
-      var td = $("td:nth-child(" + i + ")", this);
-      var sort_text = td.text();
-      if (sort_text == '') sort_text = td.html();
-      row_info.push(sort_text);
-    }
-    window.rows.push(row_info);
+    window.row_texts.push(texts);
+    window.row_search.push(texts.join('\n').toLowerCase());
   });
-  console.log("Total rows found: " + window.rows.length);
+  console.log("Total rows found: " + window.ROWS.length);
 }
 
-function filter_table() {
-  // One time setup, to build up the array of row contents combined with sortable fields.
-  if (!window.rows) { scan_rows(); }
+/* Links to the quick filters used the bare filter names before they were
+ * prefixed. Rewrite such terms of the query the page was opened with. */
+function rewrite_legacy_filters() {
+  if (!window.queries) return;
+  var queries = $.map(window.queries.split(/[+ ]/), function(q) {
+    return window.FILTERS.hasOwnProperty(q.toLowerCase()) ? FILTER_PREFIX + q.toLowerCase() : q;
+  });
+  window.queries = queries.join(' ');
+  $('.search form input').val(window.queries);
+}
 
-  // If query provided, copy only the matching rows to the result set.
-  // It not, just use the original. It gets mangled when sorting, but that's okay.
-  var result_rows;
+function filter_table() {
+  // If query provided, collect only the indices of the matching rows.
+  var result_rows = null;
+  var queries = [];
   if (window.queries) {
-    var queries = window.queries.split("+");
+    queries = window.queries.split(/[+ ]/);
     queries = $.map(queries, function(q) {
       // Disregard short terms.
       if (q.length < 3) return null;
-      
+
       // Terms to lowercase.
-      q = q.toLowerCase();
+      return q.toLowerCase();
+    });
+  }
 
-      // Transform "magic" queries as necessary.
-      return QUERY_TRANSFORMS[q] || q;
+  if (window.previous_queries && window.previous_queries.toString() == queries.toString() &&
+      window.previous_sort == window.sort &&
+      window.previous_reverse == window.reverse) {
+    console.log("No change, skipping rebuilding table.");
+    return
+  } else {
+    window.previous_queries = queries;
+    window.previous_sort = window.sort;
+    window.previous_reverse = window.reverse;
+  }
+
+  if (queries.length > 0) {
+    console.log("Filtering for queries:", queries);
+    // Quick filters are looked up in the precomputed row indices.
+    var text_queries = [];
+    $.each(queries, function(i, q) {
+      var filter_rows = null;
+      if (q.indexOf(FILTER_PREFIX) == 0) {
+        var filter = q.slice(FILTER_PREFIX.length);
+        if (window.FILTERS.hasOwnProperty(filter)) filter_rows = window.FILTERS[filter];
+      }
+      if (!filter_rows) {
+        text_queries.push(q);
+      } else if (result_rows === null) {
+        result_rows = filter_rows.slice();
+      } else {
+        var selected = {};
+        $.each(filter_rows, function(j, row) { selected[row] = true; });
+        result_rows = $.grep(result_rows, function(row) { return selected[row]; });
+      }
     });
-    
-    if (window.previous_queries && window.previous_queries.toString() == queries.toString() &&
-        window.previous_sort == window.sort &&
-        window.previous_reverse == window.reverse) {
-      console.log("No change, skipping rebuilding table.");
-      return
-    } else {
-      window.previous_queries = queries;
-      window.previous_sort = window.sort;
-      window.previous_reverse = window.reverse;
+    if (result_rows === null) {
+      result_rows = [];
+      for (var i = 0; i < window.ROWS.length; i++) result_rows.push(i);
     }
-
-    if (queries.length > 0) {
-      console.log("Filtering for queries:", queries);
-      result_rows = $.map(window.rows, function(row) {
-        for (var i = 0; i < queries.length; i++) {
-          var is_known_query = false
-          for(var q in QUERY_TRANSFORMS) {
-            if (queries[i] === QUERY_TRANSFORMS[q]) {
-              is_known_query = true;
-              break;
-            }
-          }
-          if(is_known_query) {
-            // search in full row html
-            if (row[0].indexOf(queries[i]) == -1) return null;
-          } else {
-            // search in plain text of each column
-            match = false;
-            for (var j = 1; j < row.length; j++) {
-              if (row[j] && row[j].indexOf(queries[i]) != -1) {
-                match = true;
-                break;
-              }
-            }
-            if (!match) return null;
-          }
+    // Everything else is searched in the plain text of the meta columns.
+    if (text_queries.length > 0) {
+      result_rows = $.grep(result_rows, function(row) {
+        for (var j = 0; j < text_queries.length; j++) {
+          if (window.row_search[row].indexOf(text_queries[j]) == -1) return false;
         }
-        return [row];
+        return true;
       });
-    } else {
-      console.log("No query terms, returning whole set.");
-      result_rows = window.rows;
     }
   } else {
     console.log("No query, returning whole set.");
-    result_rows = window.rows;
+    result_rows = [];
+    for (var i = 0; i < window.ROWS.length; i++) result_rows.push(i);
   }
 
   console.log("Result rows found: " + result_rows.length);
-  $("#search-count").text("showing " + result_rows.length + " of " + rows.length + " total");
+  $("#search-count").text("showing " + result_rows.length + " of " + window.ROWS.length + " total");
 
   if (window.sort) {
-    var sort = parseInt(window.sort);
+    var sort = parseInt(window.sort) - 1;
     var order = 1;
     if (window.reverse == 1) order = -1;
     result_rows.sort(function(a, b) {
-      if (a[sort] > b[sort]) return order;
-      if (a[sort] < b[sort]) return -order;
+      a = window.row_texts[a][sort];
+      b = window.row_texts[b][sort];
+      if (a > b) return order;
+      if (a < b) return -order;
       return 0;
     });
   }
 
-  var result_rows_plain = $.map(result_rows, function(row) { return row[0]; });
-
-  // It's still a nasty rendering pause as the browser crunches through this. A possible
-  // future optimization would be to have multiple tbody elements, chunk up the resulting
-  // rows, and load them in in batches, separated by zero timeouts.
-  $('table tbody').html("<tr/><tr>" + result_rows_plain.join("</tr><tr>") + "</tr>");
+  window.result_rows = result_rows;
+  render_rows(true);
 
   if (window.history && window.history.replaceState) {
     var qs = [];
@@ -307,3 +295,33 @@ function filter_table() {
   }
 }
 
+/* Only the rows in and around the viewport are added to the DOM. Spacer rows
+ * above and below them keep the height of the table (and the scrollbar) as if
+ * all rows were present. */
+function render_rows(force) {
+  var result_rows = window.result_rows;
+  if (!result_rows) return;
+  var tbody = $('table tbody');
+
+  if (!window.row_height && result_rows.length > 0) {
+    // Measure the height of a single row once.
+    tbody.html('<tr>' + window.row_html[result_rows[0]] + '</tr>');
+    window.row_height = tbody.children().first().height() || 1;
+  }
+  var row_height = window.row_height || 1;
+
+  var offset = $(window).scrollTop() - tbody.offset().top;
+  var first = Math.max(0, Math.floor(offset / row_height) - RENDER_MARGIN);
+  var count = Math.ceil($(window).height() / row_height) + 2 * RENDER_MARGIN;
+  var last = Math.min(result_rows.length, first + count);
+  if (!force && first == window.rendered_first && last == window.rendered_last) return;
+  window.rendered_first = first;
+  window.rendered_last = last;
+
+  var html = ['<tr class="spacer" style="height: ' + (first * row_height) + 'px"></tr>'];
+  for (var i = first; i < last; i++) {
+    html.push('<tr' + (i % 2 ? '' : ' class="odd"') + '>' + window.row_html[result_rows[i]] + '</tr>');
+  }
+  html.push('<tr class="spacer" style="height: ' + ((result_rows.length - last) * row_height) + 'px"></tr>');
+  tbody.html(html.join(''));
+}
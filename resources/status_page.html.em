@@ -49,13 +49,13 @@ import time
       <input type="text" name="q" id="q" />
       <p>Quick:
         <a href="?q=" title="Show all packages">all</a>,
-        <a href="?q=sync" title="Filter packages which are affected by a sync from shadow-fixed to public">sync</a>,
-        <a href="?q=regression" title="Filter packages which disappear by a sync from shadow-fixed to public">regression</a>,
-        <a href="?q=diff" title="Filter packages which are different between architectures">diff</a>,
-        <a href="?q=blue">blue</a>,
-        <a href="?q=red">red</a>,
-        <a href="?q=yellow">yellow</a>,
-        <a href="?q=gray">gray</a>
+        <a href="?q=is:sync" title="Filter packages which are affected by a sync from shadow-fixed to public">sync</a>,
+        <a href="?q=is:regression" title="Filter packages which disappear by a sync from shadow-fixed to public">regression</a>,
+        <a href="?q=is:diff" title="Filter packages which are different between architectures">diff</a>,
+        <a href="?q=is:blue">blue</a>,
+        <a href="?q=is:red">red</a>,
+        <a href="?q=is:yellow">yellow</a>,
+        <a href="?q=is:gray">gray</a>
       </p>
       <p id="search-count"></p>
     </form>
@@ -70,11 +70,16 @@ import time
     </thead>
     <tbody>
       <script type="text/javascript">window.tbody_ready();</script>
-@[for row in rows]@
-      <tr>@[for cell in row]<td>@(cell)</td>@[end for]</tr>
-@[end for]@
     </tbody>
   </table>
+  <script type="text/javascript">
+    window.ROWS = [
+@[for row in rows]@
+@(to_json(row)),
+@[end for]@
+    ];
+    window.FILTERS = @(to_json(filters));
+  </script>
 </body>
 <script type="text/javascript">window.body_done();</script>
 </html>
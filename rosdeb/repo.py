@@ -36,6 +36,7 @@
 Utilities for reading state from a debian repo
 """
 
+import collections
 import urllib2
 import re
 
@@ -111,29 +112,47 @@ def deb_in_repo(repo_url, deb_name, deb_version, os_platform, arch, use_regex=Tr
         M = re.search('^Package: %s\nVersion: %s$'%(deb_name, deb_version), packagelist, re.MULTILINE)
         return M is not None
 
+def get_reverse_depends(repo_url, os_platform, arch, cache=None):
+    """
+    Get the reverse dependencies of all packages in the Packages list.
+    The index is computed once per list and stored in the cache.
+    @return: dict mapping package names to the set of packages which
+    directly depend on them
+    """
+    if cache is None:
+        cache = _Packages_cache
+    key = ('reverse_depends', repo_url, os_platform, arch)
+    if key not in cache:
+        reverse_depends = {}
+        for package, _, deps, _ in load_Packages(repo_url, os_platform, arch, cache):
+            for d in deps:
+                #strip of version specifications from deps
+                parts = d.split()
+                if parts:
+                    reverse_depends.setdefault(parts[0], set()).add(package)
+        cache[key] = reverse_depends
+    return cache[key]
+
 def get_depends(repo_url, deb_name, os_platform, arch):
     """
     Get all debian package dependencies by scraping the Packages
     list. We mainly use this for invalidation logic. 
+    @param deb_name: a package name or a list of package names
     """
     # There is probably something much simpler we could do, but this
     # more robust to any bad state we may have caused to the shadow
     # repo.
-    package_deps = load_Packages(repo_url, os_platform, arch)
-    done = False
-    queue = [deb_name]
+    reverse_depends = get_reverse_depends(repo_url, os_platform, arch)
+    if isinstance(deb_name, basestring):
+        deb_name = [deb_name]
+    queue = collections.deque(deb_name)
     depends = set()
-    # This is not particularly efficient, but it does not need to
-    # be. Basically, we find all the packages that depend on the
-    # package, then find all the packages that depends on those,
-    # etc...
+    # Find all the packages that depend on the package, then find all
+    # the packages that depends on those, etc...
     while queue:
-        next  = queue[0]
-        queue = queue[1:]
-        for package, _, deps, _ in package_deps:
-            #strip of version specifications from deps
-            deps = [d.split()[0] for d in deps]
-            if package not in depends and next in deps:
+        next = queue.popleft()
+        for package in reverse_depends.get(next, []):
+            if package not in depends:
                 queue.append(package)
                 depends.add(package)
     return list(depends)
@@ -3,10 +3,12 @@
 from __future__ import print_function
 import argparse
 import os
+import sys
 import tempfile
 import urllib2
 
-from buildfarm import jenkins_support, release_jobs
+from buildfarm import jenkins_support, job_plan, release_jobs
+from buildfarm.job_pool import DEFAULT_MAX_WORKERS, JobPool
 
 from buildfarm.ros_distro import debianize_package_name
 
@@ -40,11 +42,28 @@ def parse_options():
                         help='A directory into which all the repositories will be checked out into.')
     parser.add_argument('--repos', nargs='+',
                         help='A list of repository (or stack) names to create. Default: creates all')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='The maximum number of jobs to configure concurrently, the actual number adapts to the response times and errors of the Jenkins server. Default: %(default)s')
+    parser.add_argument('--ignore-fingerprints', action='store_true', default=False,
+                        help='Compare the configs of all existing jobs with the server instead of skipping the jobs whose config fingerprint is the same as when they were last configured')
+    parser.add_argument('--plan', metavar='CHANGESET',
+                        help='Compare the generated configs with the local snapshot of the jobs on the Jenkins server instead of contacting it and write the jobs to create, update and delete to this file')
+    parser.add_argument('--update-snapshot', action='store_true', default=False,
+                        help='Refresh the local snapshot of the jobs on the Jenkins server used by --plan')
+    parser.add_argument('--apply', metavar='CHANGESET',
+                        help='Push the changes of a changeset written by --plan to the Jenkins server without generating the configs')
     parser.add_argument('--ssh-key-id',
                         help="Jenkins SSH key ID for accessing the package server")
     args = parser.parse_args()
     if args.repos and args.delete:
         parser.error('A set of repos to create can not be combined with the --delete option.')
+    if args.plan and args.commit:
+        parser.error('The --plan option can not be combined with the --commit option.')
+    if args.apply and (args.plan or args.commit or args.update_snapshot):
+        parser.error('The --apply option can not be combined with the --plan, --commit or --update-snapshot option.')
+    if args.rosdistro == 'backports' and (args.plan or args.update_snapshot or args.apply):
+        # the names of the backports jobs don't contain the rosdistro
+        parser.error('The --plan, --update-snapshot and --apply options are not supported for backports.')
 
     if args.rosdistro == 'fuerte':
         if args.fqdn is None:
@@ -55,15 +74,129 @@ def parse_options():
     return args
 
 
-def doit(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro, packages, dry_maintainers, commit=False, delete_extra_jobs=False, whitelist_repos=None, sourcedeb_timeout=None, binarydeb_timeout=None, ssh_key_id=None):
+def get_jenkins_instance():
+    return jenkins_support.JenkinsConfig_to_handle(jenkins_support.load_server_config_file(jenkins_support.get_default_catkin_debs_config()))
+
+
+def get_fingerprints(jenkins_instance):
+    return jenkins_support.JobFingerprints(jenkins_support.get_default_job_fingerprints_file(), jenkins_instance.server)
+
+
+def get_snapshot(jenkins_instance, rosdistro):
+    return jenkins_support.JobFingerprints(jenkins_support.get_default_job_snapshot_file(rosdistro), jenkins_instance.server)
+
+
+def update_snapshot(rosdistro, max_workers=DEFAULT_MAX_WORKERS):
+    jenkins_instance = get_jenkins_instance()
+    fingerprints = get_fingerprints(jenkins_instance)
+    snapshot = get_snapshot(jenkins_instance, rosdistro)
+    try:
+        job_plan.update_snapshot(snapshot, jenkins_instance, rosdistro, fingerprints, max_workers=max_workers)
+    except urllib2.URLError as e:
+        raise urllib2.URLError(str(e) + ' (%s)' % jenkins_instance.server)
+    snapshot.save()
+
+
+def apply_changeset(path, rosdistro, max_workers=DEFAULT_MAX_WORKERS):
+    changeset = job_plan.read_changeset(path)
+    job_plan.print_changeset(changeset)
+    jenkins_instance = get_jenkins_instance()
+    fingerprints = get_fingerprints(jenkins_instance)
+    snapshot = get_snapshot(jenkins_instance, rosdistro)
+    try:
+        results = job_plan.apply_changeset(changeset, jenkins_instance, rosdistro, fingerprints, snapshot if snapshot.loaded else None, max_workers=max_workers)
+    finally:
+        fingerprints.save()
+        if snapshot.loaded:
+            snapshot.save()
+    release_jobs.summarize_results(*results)
+
+
+def doit(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro, packages, dry_maintainers, commit=False, delete_extra_jobs=False, whitelist_repos=None, sourcedeb_timeout=None, binarydeb_timeout=None, ssh_key_id=None, max_workers=DEFAULT_MAX_WORKERS, plan=None):
     jenkins_instance = None
-    jenkins_jobs = []
-    if args.commit or delete_extra_jobs:
-        jenkins_instance = jenkins_support.JenkinsConfig_to_handle(jenkins_support.load_server_config_file(jenkins_support.get_default_catkin_debs_config()))
+    jenkins_jobs = set()
+    fingerprints = None
+    snapshot = None
+    if plan:
+        # only the local snapshot is used instead of contacting the server
+        jenkins_instance = get_jenkins_instance()
+        snapshot = get_snapshot(jenkins_instance, rosdistro)
+        if not snapshot.loaded:
+            raise RuntimeError("No snapshot of the jobs on '%s' found, create it with --update-snapshot" % jenkins_instance.server)
+        jenkins_jobs = snapshot.get_job_names()
+    elif args.commit or delete_extra_jobs:
+        jenkins_instance = get_jenkins_instance()
         try:
-            jenkins_jobs = jenkins_instance.get_jobs()
+            jenkins_jobs = set([j['name'] for j in jenkins_instance.get_jobs()])
         except urllib2.URLError as e:
             raise urllib2.URLError(str(e) + ' (%s)' % jenkins_instance.server)
+        fingerprints = get_fingerprints(jenkins_instance)
+        fingerprints.prune(jenkins_jobs)
+        if args.ignore_fingerprints:
+            # forget all fingerprints to compare every config with the server
+            fingerprints.prune(set())
+
+    job_pool = None
+    if plan:
+        job_pool = job_plan.JobPlan(rosdistro)
+    elif commit and max_workers > 1:
+        def configure_job(job_name, config):
+            return release_jobs.configure_jenkins_job(job_name, config, jenkins_instance, jenkins_jobs, fingerprints)
+        job_pool = JobPool(configure_job, max_workers=max_workers)
+    try:
+        results = configure_jobs(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro, packages, dry_maintainers, commit, whitelist_repos, sourcedeb_timeout, binarydeb_timeout, ssh_key_id, jenkins_instance, jenkins_jobs, job_pool, fingerprints)
+    except BaseException:
+        # don't push the remaining jobs after an error or Ctrl-C
+        if job_pool is not None and not plan:
+            job_pool.cancel()
+        raise
+    finally:
+        if job_pool is not None and not plan:
+            job_pool.join()
+        if commit and fingerprints is not None:
+            fingerprints.save()
+    if job_pool is not None:
+        for k, v in results.items():
+            results[k] = job_pool.update_results(*v)
+
+    # extra jobs can only be detected if all jobs have been configured,
+    # configure_jobs returns early for --wet-only and backports without
+    # generating the dry jobs
+    all_jobs_configured = not args.wet_only and rosdistro != 'backports'
+    if delete_extra_jobs and all_jobs_configured:
+        assert(not whitelist_repos)
+        # clean up extra jobs
+        configured_jobs = set()
+
+        for jobs in results.values():
+            release_jobs.summarize_results(*jobs)
+            for e in jobs:
+                configured_jobs.update(set(e))
+
+        relevant_jobs = jenkins_jobs - configured_jobs
+        relevant_jobs = [j for j in relevant_jobs if job_plan.is_release_job(j, rosdistro)]
+
+        for j in relevant_jobs:
+            print('Job "%s" detected as extra' % j)
+            if plan:
+                job_pool.delete(j)
+            elif commit:
+                jenkins_instance.delete_job(j)
+                fingerprints.remove(j)
+                print('Deleted job "%s"' % j)
+        if commit:
+            fingerprints.save()
+
+    if plan:
+        changeset = job_pool.get_changeset(snapshot)
+        job_plan.write_changeset(plan, changeset)
+        job_plan.print_changeset(changeset)
+        print('Wrote changeset to "%s", push it to the server with "--apply %s"' % (plan, plan))
+
+    return results
+
+
+def configure_jobs(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro, packages, dry_maintainers, commit, whitelist_repos, sourcedeb_timeout, binarydeb_timeout, ssh_key_id, jenkins_instance, jenkins_jobs, job_pool, fingerprints):
 
     # Figure out default distros.  Command-line arg takes precedence; if
     # it's not specified, then read targets.yaml.
@@ -112,7 +245,9 @@ def doit(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro
                                                   jenkins_jobs=jenkins_jobs,
                                                   sourcedeb_timeout=sourcedeb_timeout,
                                                   binarydeb_timeout=binarydeb_timeout,
-                                                  ssh_key_id=ssh_key_id)
+                                                  ssh_key_id=ssh_key_id,
+                                                  job_pool=job_pool,
+                                                  fingerprints=fingerprints)
             #time.sleep(1)
             #print ('individual results', results[pkg_name])
 
@@ -149,35 +284,15 @@ def doit(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro
             if not d.stacks[s].version:
                 print('- skipping "%s" since version is null' % s)
                 continue
-            results[rd.debianize_package_name(s)] = release_jobs.dry_doit(s, dry_maintainers[s], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id)
+            results[rd.debianize_package_name(s)] = release_jobs.dry_doit(s, dry_maintainers[s], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id, job_pool=job_pool, fingerprints=fingerprints)
             #time.sleep(1)
 
     # special metapackages job
     if not whitelist_repos or 'metapackages' in whitelist_repos:
-        results[rd.debianize_package_name('metapackages')] = release_jobs.dry_doit('metapackages', [], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id)
+        results[rd.debianize_package_name('metapackages')] = release_jobs.dry_doit('metapackages', [], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id, job_pool=job_pool, fingerprints=fingerprints)
 
     if not whitelist_repos or 'sync' in whitelist_repos:
-        results[rd.debianize_package_name('sync')] = release_jobs.dry_doit('sync', [], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id)
-
-    if delete_extra_jobs:
-        assert(not whitelist_repos)
-        # clean up extra jobs
-        configured_jobs = set()
-
-        for jobs in results.values():
-            release_jobs.summarize_results(*jobs)
-            for e in jobs:
-                configured_jobs.update(set(e))
-
-        existing_jobs = set([j['name'] for j in jenkins_jobs])
-        relevant_jobs = existing_jobs - configured_jobs
-        relevant_jobs = [j for j in relevant_jobs if rosdistro in j and ('_sourcedeb' in j or '_binarydeb' in j)]
-
-        for j in relevant_jobs:
-            print('Job "%s" detected as extra' % j)
-            if commit:
-                jenkins_instance.delete_job(j)
-                print('Deleted job "%s"' % j)
+        results[rd.debianize_package_name('sync')] = release_jobs.dry_doit('sync', [], default_distros, target_arches, fqdn, rosdistro, jobgraph=jobs_graph, commit=commit, jenkins_instance=jenkins_instance, jenkins_jobs=jenkins_jobs, packages_for_sync=packages_for_sync, ssh_key_id=ssh_key_id, job_pool=job_pool, fingerprints=fingerprints)
 
     return results
 
@@ -185,6 +300,14 @@ def doit(rd, distros, arches, apt_target_repository, fqdn, jobs_graph, rosdistro
 if __name__ == '__main__':
     args = parse_options()
 
+    if args.apply:
+        apply_changeset(args.apply, args.rosdistro, max_workers=args.jobs)
+        sys.exit(0)
+
+    if args.update_snapshot:
+        print('Updating the snapshot of the jobs for %s' % args.rosdistro)
+        update_snapshot(args.rosdistro, max_workers=args.jobs)
+
     print('Loading rosdistro %s' % args.rosdistro)
 
     workspace = args.repo_workspace
@@ -231,7 +354,7 @@ if __name__ == '__main__':
         stack_depends, dry_maintainers = {}, {}
         dry_jobgraph = {}
 
-    combined_jobgraph = {}
+    combined_jobgraph = release_jobs.JobGraph()
     for k, v in dry_jobgraph.iteritems():
         combined_jobgraph[k] = v
     for k, v in dependencies.iteritems():
@@ -256,7 +379,9 @@ if __name__ == '__main__':
         whitelist_repos=args.repos,
         sourcedeb_timeout=sourcedeb_timeout,
         binarydeb_timeout=binarydeb_timeout,
-        ssh_key_id=args.ssh_key_id)
+        ssh_key_id=args.ssh_key_id,
+        max_workers=args.jobs,
+        plan=args.plan)
 
-    if not args.commit:
+    if not args.commit and not args.plan:
         print('This was not pushed to the server.  If you want to do so use "--commit" to do it for real.')
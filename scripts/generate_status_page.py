@@ -7,8 +7,9 @@ import os
 import sys
 import time
 
-from buildfarm.apt_data import get_version_data
-from buildfarm.status_page import get_distro_arches, render_csv, transform_csv_to_html
+from buildfarm.apt_data import DEFAULT_FETCH_JOBS, get_apt_data, RosdistroData
+from buildfarm.status_page import get_debian_name_prefixes, get_distro_arches, get_package_infos, load_package_xml_cache, load_row_cache, make_status_rows, read_csv, save_package_xml_cache, save_row_cache, write_csv, write_html
+from buildfarm.status_table import read_status_table, write_status_table
 from rosdistro import get_cached_distribution, get_index, get_index_url
 
 JENKINS_HOST = 'http://jenkins.ros.org'
@@ -22,13 +23,22 @@ def parse_options(args=sys.argv[1:]):
                    ' This should be created using the build_caches command.')
     p.add_argument('--skip-fetch', action='store_true',
                    help='Skip fetching the apt data.')
+    p.add_argument('--jobs', type=int, default=DEFAULT_FETCH_JOBS,
+                   help='Number of apt list files to download and'
+                   ' package.xml files to parse concurrently.'
+                   ' Default: %(default)s')
     p.add_argument('--skip-csv', action='store_true',
                    help='Skip generating .csv file.')
+    p.add_argument('--skip-row-cache', action='store_true',
+                   help='Format all rows and parse all package.xml files'
+                   ' instead of reusing the unchanged ones of the previous'
+                   ' run.')
     p.add_argument('--resources', default='.',
                    help='Path to resources (e.g. css and js files).')
-    p.add_argument('rosdistro', default='groovy',
-                   help='The ROS distro to generate the status page'
-                   ' for (i.e. groovy).')
+    p.add_argument('rosdistros', metavar='rosdistro', nargs='+',
+                   help='The ROS distros to generate the status page'
+                   ' for (i.e. groovy). The apt data is fetched once and'
+                   ' shared between all of them.')
     p.add_argument('--build-repo',
                    default='http://repos.ros.org/repos/building',
                    help='Repository URL for the build farm repository.')
@@ -51,46 +61,15 @@ def parse_options(args=sys.argv[1:]):
     return p.parse_args(args)
 
 
-if __name__ == '__main__':
-    args = parse_options()
-
-    start_time = time.localtime()
-
-    ros_repos = {'ros': args.public_repo,
-                 'shadow-fixed': args.shadow_repo,
-                 'building': args.build_repo}
-
-    distro_arches = []
-    if args.da:
-        distro_arches = [tuple(a.split(',')) for a in args.da]
-    elif args.distros:
-        distro_arches = [(d, a) for d in args.distros for a in args.arches]
-    else:
-        distro_arches = get_distro_arches(args.arches, args.rosdistro)
-
-    csv_file = os.path.join(args.basedir, '%s.csv' % args.rosdistro)
-    if not args.skip_csv:
-        print('Assembling apt version cache')
-        rd_data, apt_data = get_version_data(args.basedir, args.rosdistro,
-                                             ros_repos, distro_arches,
-                                             apt_update=not args.skip_fetch)
-        print('Generating .csv file...')
-        render_csv(rd_data, apt_data, csv_file, args.rosdistro,
-                   distro_arches, ros_repos)
-    elif not os.path.exists(csv_file):
-        print('.csv file "%s" is missing. Call script without "--skip-csv".' %
-              csv_file, file=sys.stderr)
-    else:
-        print('Skip generating .csv file')
-
+def get_metadata_builder(rosdistro):
     def metadata_builder(column_data):
         build_argstring = column_data.split('_')
         distro = build_argstring[0]
         arch = build_argstring[1]
         is_source = arch == 'source'
         data = {
-            'rosdistro': args.rosdistro,
-            'rosdistro_short': args.rosdistro[0].upper(),
+            'rosdistro': rosdistro,
+            'rosdistro_short': rosdistro[0].upper(),
             'distro': distro,
             'distro_short': distro[0].upper(),
             'is_source': is_source
@@ -120,21 +99,98 @@ if __name__ == '__main__':
         data['job_url'] = ('{view_url}job/%s/' % job_name).format(**data)
 
         return data
+    return metadata_builder
+
+
+def generate_status_page(args, rosdistro, distro_arches, ros_repos, index, apt_data, start_time):
+    csv_file = os.path.join(args.basedir, '%s.csv' % rosdistro)
+    table_file = os.path.join(args.basedir, '%s.table' % rosdistro)
+    if apt_data is not None:
+        print('Generating status rows for "%s"...' % rosdistro)
+        rd_data = RosdistroData(rosdistro, index=index)
+        da_strs, rows = make_status_rows(rd_data, apt_data, rosdistro,
+                                         distro_arches, ros_repos)
+        print('Generating .csv file...')
+        write_csv(da_strs, rows, csv_file)
+        write_status_table(da_strs, rows, table_file)
+    elif os.path.exists(table_file):
+        print('Skip generating .csv file')
+        da_strs, rows = read_status_table(table_file)
+    elif not os.path.exists(csv_file):
+        print('.csv file "%s" is missing. Call script without "--skip-csv".' %
+              csv_file, file=sys.stderr)
+        sys.exit(1)
+    else:
+        print('Skip generating .csv file')
+        with open(csv_file, 'r') as f:
+            da_strs, rows = read_csv(f)
 
-    if args.rosdistro != 'fuerte':
-        index = get_index(get_index_url())
-        cached_distribution = get_cached_distribution(index, args.rosdistro)
+    if rosdistro != 'fuerte':
+        cached_distribution = get_cached_distribution(index, rosdistro)
     else:
         cached_distribution = None
 
-    print('Transforming .csv into .html file...')
+    print('Resolving package information...')
+    package_xml_cache_file = os.path.join(args.basedir, '%s.package_xml.pickle' % rosdistro)
+    package_xml_cache = {}
+    if not args.skip_row_cache:
+        package_xml_cache = load_package_xml_cache(package_xml_cache_file)
+    package_infos = get_package_infos(cached_distribution, rows, package_xml_cache, jobs=args.jobs)
+    save_package_xml_cache(package_xml_cache_file, package_xml_cache, package_infos)
+
+    print('Generating .html file...')
     template_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'resources', 'status_page.html.em')
-    with open(csv_file, 'r') as f:
-        html = transform_csv_to_html(f, metadata_builder, args.rosdistro,
-                                     start_time, template_file, args.resources, cached_distribution)
-    html_file = os.path.join(args.basedir, '%s.html' % args.rosdistro)
-    with open(html_file, 'w') as f:
-        f.write(html)
+    row_cache_file = os.path.join(args.basedir, '%s.rows.pickle' % rosdistro)
+    row_cache = {}
+    if not args.skip_row_cache:
+        row_cache = load_row_cache(row_cache_file, da_strs)
+    html_file = os.path.join(args.basedir, '%s.html' % rosdistro)
+    with open(html_file + '.tmp', 'w') as f:
+        write_html(f, da_strs, rows, get_metadata_builder(rosdistro), rosdistro,
+                   start_time, template_file, args.resources, package_infos,
+                   row_cache=row_cache)
+    os.rename(html_file + '.tmp', html_file)
+    save_row_cache(row_cache_file, da_strs, row_cache, rows)
+
+    print('Generated .html file "%s"' % html_file)
+
+
+if __name__ == '__main__':
+    args = parse_options()
+
+    start_time = time.localtime()
+
+    ros_repos = {'ros': args.public_repo,
+                 'shadow-fixed': args.shadow_repo,
+                 'building': args.build_repo}
+
+    # fetch the rosdistro index only once for all ros distros
+    index = get_index(get_index_url())
+
+    distro_arches = {}
+    for rosdistro in args.rosdistros:
+        if args.da:
+            distro_arches[rosdistro] = [tuple(a.split(',')) for a in args.da]
+        elif args.distros:
+            distro_arches[rosdistro] = [(d, a) for d in args.distros for a in args.arches]
+        else:
+            distro_arches[rosdistro] = get_distro_arches(args.arches, rosdistro, index)
+
+    apt_data = None
+    if not args.skip_csv:
+        print('Assembling apt version cache')
+        # the union of the distro arches of all ros distros
+        all_distro_arches = []
+        for rosdistro in args.rosdistros:
+            all_distro_arches += [da for da in distro_arches[rosdistro] if da not in all_distro_arches]
+        apt_data = get_apt_data(args.basedir, ros_repos, all_distro_arches,
+                                apt_update=not args.skip_fetch,
+                                jobs=args.jobs,
+                                name_prefixes=get_debian_name_prefixes(args.rosdistros))
+
+    for rosdistro in args.rosdistros:
+        generate_status_page(args, rosdistro, distro_arches[rosdistro], ros_repos,
+                             index, apt_data, start_time)
 
     print('Symlinking js and css...')
     for res in ['js', 'css']:
@@ -143,5 +199,3 @@ if __name__ == '__main__':
             src = os.path.join(os.path.dirname(os.path.dirname(__file__)),
                                'resources', res)
             os.symlink(os.path.abspath(src), dst)
-
-    print('Generated .html file "%s"' % html_file)
@@ -0,0 +1,48 @@
+import jenkins
+
+
+class FakeJenkins(object):
+    """
+    In-memory stand-in for :class:`jenkins.Jenkins` recording all requests.
+    """
+
+    def __init__(self, jobs=None, url='http://jenkins.example.com/'):
+        self.server = url
+        self.jobs = dict(jobs or {})
+        self.requests = []
+
+    def get_jobs(self):
+        self.requests.append(('get_jobs', None))
+        return [{'name': name} for name in sorted(self.jobs.keys())]
+
+    def get_job_config(self, name):
+        self.requests.append(('get_job_config', name))
+        if name not in self.jobs:
+            raise jenkins.NotFoundException('Requested item could not be found')
+        return self.jobs[name]
+
+    def job_exists(self, name):
+        self.requests.append(('job_exists', name))
+        return name in self.jobs
+
+    def create_job(self, name, config):
+        self.requests.append(('create_job', name))
+        if name in self.jobs:
+            raise jenkins.JenkinsException('job[%s] already exists' % name)
+        self.jobs[name] = config
+
+    def reconfig_job(self, name, config):
+        self.requests.append(('reconfig_job', name))
+        if name not in self.jobs:
+            raise jenkins.NotFoundException('Requested item could not be found')
+        self.jobs[name] = config
+
+    def delete_job(self, name):
+        self.requests.append(('delete_job', name))
+        if name not in self.jobs:
+            raise jenkins.NotFoundException('Requested item could not be found')
+        del self.jobs[name]
+
+
+def make_config(description, body='<builders/>'):
+    return "<?xml version='1.0' encoding='UTF-8'?><project><description>%s</description>%s</project>" % (description, body)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+
+from buildfarm.apt_data import get_versions_cache_path, load_versions
+
+PACKAGES = """Package: ros-hydro-foo
+Version: 1.0.0-0precise
+
+Package: ros-groovy-foo
+Version: 0.9.0-0precise
+
+Package: python-bar
+Version: 2.0
+"""
+
+
+def _write_packages(content=PACKAGES):
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'Packages')
+    with open(path, 'w') as f:
+        f.write(content)
+    return tmpdir, path
+
+
+def test_load_versions_filters_while_scanning():
+    tmpdir, path = _write_packages()
+    try:
+        versions = load_versions(path, ('ros-hydro-',))
+        assert versions == {'ros-hydro-foo': '1.0.0-0precise'}
+        # the cache only contains the packages matching the prefixes
+        assert os.path.exists(get_versions_cache_path(path, ('ros-hydro-',)))
+        assert not os.path.exists(get_versions_cache_path(path))
+        assert load_versions(path, ('ros-hydro-',)) == versions
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_load_versions_cache_per_prefixes():
+    tmpdir, path = _write_packages()
+    try:
+        load_versions(path, ('ros-hydro-',))
+        # a different prefix set must not be served from the first cache
+        assert load_versions(path, ('ros-groovy-',)) == {'ros-groovy-foo': '0.9.0-0precise'}
+        assert load_versions(path, ('ros-groovy-', 'ros-hydro-')) == {
+            'ros-hydro-foo': '1.0.0-0precise', 'ros-groovy-foo': '0.9.0-0precise'}
+        assert len(load_versions(path)) == 3
+        assert get_versions_cache_path(path, ('a', 'b')) == get_versions_cache_path(path, ('b', 'a'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_load_versions_invalidated_by_content():
+    tmpdir, path = _write_packages()
+    try:
+        load_versions(path, ('ros-hydro-',))
+        with open(path, 'w') as f:
+            f.write(PACKAGES.replace('1.0.0', '1.1.0'))
+        assert load_versions(path, ('ros-hydro-',)) == {'ros-hydro-foo': '1.1.0-0precise'}
+    finally:
+        shutil.rmtree(tmpdir)
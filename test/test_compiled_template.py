@@ -0,0 +1,90 @@
+import datetime
+import sys
+
+import em
+import pkg_resources
+
+from buildfarm.compiled_template import CompiledTemplate
+
+TEMPLATE = """header @(NAME)
+@[if ITEMS]@
+@[for i, item in enumerate(ITEMS)]@
+  @(i): @(item)
+@[end for]@
+@[else]@
+  no items
+@[end if]@
+@{total = len(ITEMS) * 2}@
+total @total @@ done
+@# a comment
+unfinished line @(NAME)"""
+
+JOB_TEMPLATES = [
+    'release_job/config.source.xml.em',
+    'release_job/source_build.sh.em',
+    'release_job/binary_build.sh.em',
+    'release_job/config.binary.xml.em',
+    'dry_release/config.xml.em',
+    'dry_release/sync_config.xml.em',
+    'dry_release/build.sh.em',
+    'dry_release/sync.sh.em',
+]
+
+JOB_VARIABLES = dict(
+    APT_TARGET_REPOSITORY='http://repos.example.com/building', ROSDISTRO_INDEX_URL='http://index.example.com',
+    RELEASE_URI='http://release.example.com', RELEASE_BRANCH='master', FQDN='repos.example.com',
+    DISTROS=['precise', 'trusty'], ARCHES=['amd64'], CHILD_PROJECTS=['a', 'b'], PACKAGE='ros-hydro-foo',
+    NOTIFICATION_EMAIL='foo@example.com', ROSDISTRO='hydro', SHORT_PACKAGE_NAME='foo', USERNAME='user',
+    TIMEOUT=None, SSH_KEY_ID='key', ARCH='amd64', DISTRO='precise', DEPENDENTS=['bar'], PRIORITY=899,
+    COMMAND='echo &amp;', TIMESTAMP=datetime.datetime(2014, 1, 1), STACK_NAME='foo', IS_METAPACKAGES=False,
+    PACKAGES_FOR_SYNC='10')
+
+
+def _install_stdout_proxy():
+    # EmPy refuses to create interpreters if sys.stdout has been replaced
+    # after it installed its proxy, e.g. by the output capturing of nose
+    if not hasattr(sys.stdout, '_testProxy'):
+        sys.stdout = em.ProxyFile(sys.stdout)
+
+
+def test_same_as_expand():
+    _install_stdout_proxy()
+    template = CompiledTemplate(TEMPLATE)
+    for variables in [dict(NAME='foo', ITEMS=['a', 'b']), dict(NAME='bar', ITEMS=[])]:
+        assert template.render(variables) == em.expand(TEMPLATE, **variables)
+
+
+def test_job_templates():
+    _install_stdout_proxy()
+    for name in JOB_TEMPLATES:
+        data = pkg_resources.resource_string('buildfarm', 'resources/templates/' + name)
+        template = CompiledTemplate(data)
+        for i in range(3):
+            variables = dict(JOB_VARIABLES, CHILD_PROJECTS=['child%d' % j for j in range(i)],
+                             IS_METAPACKAGES=bool(i % 2), PACKAGE='ros-hydro-foo%d' % i)
+            assert template.render(variables) == em.expand(data, **variables), name
+
+
+def test_memoization():
+    _install_stdout_proxy()
+    template = CompiledTemplate('@(NAME) @(ITEMS)', max_memoized=2)
+    variables = dict(NAME='foo', ITEMS=['a'], UNUSED=object())
+    result = template.render(variables)
+    assert result == "foo ['a']"
+    assert len(template._memo) == 1
+    # variables not referenced by the template are not part of the key
+    assert template.render(dict(variables, UNUSED=object())) is result
+    assert len(template._memo) == 1
+    assert template.render(dict(variables, ITEMS=['b'])) == "foo ['b']"
+    assert template.render(dict(variables, NAME='bar')) == "bar ['a']"
+    assert len(template._memo) <= 2
+    # unhashable values are rendered without being memoized
+    assert template.render(dict(NAME='foo', ITEMS=[set()])) == "foo [set([])]"
+
+
+def test_variables_not_modified():
+    _install_stdout_proxy()
+    template = CompiledTemplate('@{X = 2}@(X)')
+    variables = {'X': 1}
+    assert template.render(variables) == '2'
+    assert variables == {'X': 1}
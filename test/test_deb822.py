@@ -0,0 +1,44 @@
+from StringIO import StringIO
+
+from buildfarm.deb822 import iter_lines, iter_stanzas
+
+PACKAGES = """Package: ros-hydro-foo
+Version: 1.0.0-0precise
+Description: first line
+ second line
+ third line
+
+Package: ros-hydro-bar
+Architecture: amd64
+Version: 2.0.0-0precise
+
+
+Package: python-baz
+Version: 3.0
+"""
+
+
+def test_iter_lines_across_chunks():
+    data = 'first\nsecond line\n\nlast'
+    assert list(iter_lines(StringIO(data), chunk_size=3)) == ['first', 'second line', '', 'last']
+
+
+def test_iter_stanzas():
+    stanzas = list(iter_stanzas(StringIO(PACKAGES), ['Package', 'Version'], chunk_size=7))
+    assert stanzas == [
+        {'Package': 'ros-hydro-foo', 'Version': '1.0.0-0precise'},
+        {'Package': 'ros-hydro-bar', 'Version': '2.0.0-0precise'},
+        {'Package': 'python-baz', 'Version': '3.0'},
+    ]
+
+
+def test_iter_stanzas_multiline_field():
+    stanzas = list(iter_stanzas(StringIO(PACKAGES), ['Description']))
+    assert stanzas[0] == {'Description': 'first line\nsecond line\nthird line'}
+    assert stanzas[1] == {}
+
+
+def test_iter_stanzas_filter():
+    stanzas = list(iter_stanzas(StringIO(PACKAGES), ['Package', 'Version'], filter_field='Package',
+                                filter_func=lambda name: name.startswith('ros-hydro-')))
+    assert [s['Package'] for s in stanzas] == ['ros-hydro-foo', 'ros-hydro-bar']
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+
+import jenkins
+
+from buildfarm.jenkins_support import JobFingerprints
+from buildfarm.release_jobs import add_config_fingerprint, configure_jenkins_job, create_jenkins_job, \
+    get_config_fingerprint, get_remote_config_fingerprint
+
+from fake_jenkins import FakeJenkins, make_config
+
+URL = 'http://jenkins.example.com/'
+
+
+def test_config_fingerprint():
+    fingerprint = get_config_fingerprint(make_config('foo'))
+    # the description is not part of the fingerprint
+    assert fingerprint == get_config_fingerprint(make_config('bar'))
+    assert fingerprint == get_config_fingerprint(unicode(make_config('bar')))
+    assert fingerprint != get_config_fingerprint(make_config('foo', '<builders><x/></builders>'))
+
+    config = add_config_fingerprint(make_config('foo'), fingerprint)
+    assert get_config_fingerprint(config) == fingerprint
+    assert get_remote_config_fingerprint(config) == fingerprint
+    assert get_remote_config_fingerprint(make_config('foo')) is None
+
+
+def test_job_fingerprints():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'buildfarm', 'fingerprints.json')
+        fingerprints = JobFingerprints(path, URL)
+        assert not fingerprints.loaded
+        fingerprints.set('a', 'fa')
+        fingerprints.set('b', 'fb')
+        fingerprints.set('c', None)
+        fingerprints.remove('b')
+        fingerprints.remove('unknown')
+        fingerprints.save()
+
+        fingerprints = JobFingerprints(path, URL)
+        assert fingerprints.loaded
+        assert fingerprints.get_job_names() == set(['a', 'c'])
+        assert fingerprints.get('a') == 'fa'
+        assert 'c' in fingerprints and fingerprints.get('c') is None
+        assert 'b' not in fingerprints
+
+        fingerprints.prune(set(['c', 'd']))
+        assert fingerprints.get_job_names() == set(['c'])
+
+        # inventories of other servers are ignored
+        other = JobFingerprints(path, 'http://other.example.com/')
+        assert not other.loaded
+        assert other.get_job_names() == set()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_create_jenkins_job():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fingerprints = JobFingerprints(os.path.join(tmpdir, 'fingerprints.json'), URL)
+        server = FakeJenkins()
+        config = make_config('foo')
+        assert create_jenkins_job('a', config, server, set(), fingerprints)
+        assert server.requests == [('job_exists', 'a'), ('create_job', 'a')]
+        assert fingerprints.get('a') == get_config_fingerprint(config)
+        assert get_remote_config_fingerprint(server.jobs['a']) == fingerprints.get('a')
+
+        # skipped based on the local inventory without any request
+        server.requests = []
+        assert create_jenkins_job('a', config, server, set(['a']), fingerprints)
+        assert server.requests == []
+
+        # skipped based on the fingerprint in the remote config
+        fingerprints.prune(set())
+        assert create_jenkins_job('a', config, server, set(['a']), fingerprints)
+        assert server.requests == [('get_job_config', 'a')]
+        assert fingerprints.get('a') == get_config_fingerprint(config)
+
+        # changed config
+        server.requests = []
+        changed_config = make_config('foo', '<builders><x/></builders>')
+        assert create_jenkins_job('a', changed_config, server, set(['a']), fingerprints)
+        assert server.requests == [('get_job_config', 'a'), ('reconfig_job', 'a')]
+        assert fingerprints.get('a') == get_config_fingerprint(changed_config)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_create_jenkins_job_errors():
+    class ForbiddenJenkins(FakeJenkins):
+        def create_job(self, name, config):
+            raise jenkins.JenkinsException('Error in request. Possibly authentication failed [403]: Forbidden')
+
+    server = ForbiddenJenkins()
+    assert not create_jenkins_job('a', make_config('foo'), server, set())
+    try:
+        configure_jenkins_job('a', make_config('foo'), server, set())
+    except jenkins.JenkinsException as e:
+        assert 'Forbidden' in str(e)
+    else:
+        assert False
+
+
+def test_create_existing_jenkins_job():
+    server = FakeJenkins({'a': make_config('foo')})
+    # the job exists although it is not in the list of jobs, e.g. because
+    # a failed create request has been retried
+    assert configure_jenkins_job('a', make_config('bar'), server, set())
+    assert server.requests == [('job_exists', 'a'), ('reconfig_job', 'a')]
+    assert 'bar' in server.jobs['a']
@@ -0,0 +1,53 @@
+from buildfarm.release_jobs import binarydeb_job_name, calc_child_jobs, JobGraph
+
+
+def _make_graph():
+    graph = JobGraph()
+    graph['a'] = []
+    graph['b'] = ['a']
+    graph['c'] = ['a', 'b', 'a']
+    return graph
+
+
+def _reference_dependents(graph, package):
+    # the dependents as computed before the reverse index was introduced
+    return [pkg for pkg, depends in graph.iteritems() if package in depends]
+
+
+def test_get_dependents():
+    graph = _make_graph()
+    for package in ['a', 'b', 'c', 'unknown']:
+        assert graph.get_dependents(package) == _reference_dependents(graph, package)
+    # duplicate dependencies are listed once
+    assert sorted(graph.get_dependents('a')) == ['b', 'c']
+
+
+def test_invalidation():
+    graph = _make_graph()
+    assert sorted(graph.get_dependents('a')) == ['b', 'c']
+
+    graph['d'] = ['a']
+    assert sorted(graph.get_dependents('a')) == ['b', 'c', 'd']
+    del graph['b']
+    assert sorted(graph.get_dependents('a')) == ['c', 'd']
+    graph.update({'e': ['c']})
+    assert graph.get_dependents('c') == ['e']
+    graph.setdefault('f', ['c'])
+    assert sorted(graph.get_dependents('c')) == ['e', 'f']
+    graph.pop('e')
+    assert graph.get_dependents('c') == ['f']
+    graph.popitem()
+    for package in ['a', 'c']:
+        assert graph.get_dependents(package) == _reference_dependents(graph, package)
+    graph.clear()
+    assert graph.get_dependents('a') == []
+
+
+def test_calc_child_jobs():
+    graph = _make_graph()
+    expected = [binarydeb_job_name(p, 'precise', 'amd64') for p in _reference_dependents(graph, 'a')]
+    assert calc_child_jobs('a', 'precise', 'amd64', graph) == expected
+    # plain dicts are accepted too
+    assert calc_child_jobs('a', 'precise', 'amd64', dict(graph)) == expected
+    assert calc_child_jobs('a', 'precise', 'amd64', {}) == []
+    assert calc_child_jobs('a', 'precise', 'amd64', None) == []
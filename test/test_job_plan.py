@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+
+from buildfarm import job_plan
+from buildfarm.jenkins_support import JobFingerprints
+from buildfarm.release_jobs import add_config_fingerprint, get_config_fingerprint, get_remote_config_fingerprint, \
+    push_jenkins_job
+
+from fake_jenkins import FakeJenkins, make_config
+
+URL = 'http://jenkins.example.com/'
+
+UNCHANGED_CONFIG = make_config('unchanged')
+OLD_CONFIG = make_config('changed', '<builders><old/></builders>')
+NEW_CONFIG = make_config('changed', '<builders><new/></builders>')
+
+
+class TempDir(object):
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp()
+        return self.path
+
+    def __exit__(self, *args):
+        shutil.rmtree(self.path)
+
+
+def _make_server():
+    return FakeJenkins({
+        'ros-hydro-unchanged_sourcedeb': add_config_fingerprint(UNCHANGED_CONFIG, get_config_fingerprint(UNCHANGED_CONFIG)),
+        'ros-hydro-changed_binarydeb_precise_amd64': OLD_CONFIG,
+        'ros-hydro-extra_sourcedeb': make_config('extra'),
+        'ros-indigo-other_sourcedeb': make_config('other'),
+        'unrelated': make_config('unrelated'),
+    }, url=URL)
+
+
+def _make_plan():
+    plan = job_plan.JobPlan('hydro')
+    plan.submit('ros-hydro-unchanged_sourcedeb', UNCHANGED_CONFIG)
+    plan.submit('ros-hydro-changed_binarydeb_precise_amd64', NEW_CONFIG)
+    plan.submit('ros-hydro-new_sourcedeb', make_config('new'))
+    plan.delete('ros-hydro-extra_sourcedeb')
+    return plan
+
+
+def test_is_release_job():
+    assert job_plan.is_release_job('ros-hydro-foo_sourcedeb', 'hydro')
+    assert job_plan.is_release_job('ros-hydro-foo_binarydeb_precise_amd64', 'hydro')
+    assert not job_plan.is_release_job('ros-indigo-foo_sourcedeb', 'hydro')
+    assert not job_plan.is_release_job('ros-hydro-foo_devel', 'hydro')
+
+
+def test_update_snapshot():
+    with TempDir() as tmpdir:
+        server = _make_server()
+        fingerprints = JobFingerprints(os.path.join(tmpdir, 'fingerprints.json'), URL)
+        fingerprints.set('ros-hydro-extra_sourcedeb', 'known')
+        snapshot = JobFingerprints(os.path.join(tmpdir, 'snapshot.json'), URL)
+        snapshot.set('ros-hydro-removed_sourcedeb', 'stale')
+
+        job_plan.update_snapshot(snapshot, server, 'hydro', fingerprints, max_workers=2)
+        assert snapshot.get_job_names() == set([
+            'ros-hydro-unchanged_sourcedeb', 'ros-hydro-changed_binarydeb_precise_amd64', 'ros-hydro-extra_sourcedeb'])
+        assert snapshot.get('ros-hydro-unchanged_sourcedeb') == get_config_fingerprint(UNCHANGED_CONFIG)
+        assert snapshot.get('ros-hydro-changed_binarydeb_precise_amd64') == get_config_fingerprint(OLD_CONFIG)
+        assert snapshot.get('ros-hydro-extra_sourcedeb') == 'known'
+        # the configs are only fetched for jobs missing from the inventory
+        assert sorted(server.requests) == [
+            ('get_job_config', 'ros-hydro-changed_binarydeb_precise_amd64'),
+            ('get_job_config', 'ros-hydro-unchanged_sourcedeb'),
+            ('get_jobs', None)]
+
+
+def test_get_changeset():
+    snapshot = JobFingerprints('/nonexistent', URL)
+    snapshot.set('ros-hydro-unchanged_sourcedeb', get_config_fingerprint(UNCHANGED_CONFIG))
+    snapshot.set('ros-hydro-changed_binarydeb_precise_amd64', get_config_fingerprint(OLD_CONFIG))
+    snapshot.set('ros-hydro-extra_sourcedeb', None)
+
+    changeset = _make_plan().get_changeset(snapshot)
+    assert changeset['url'] == URL
+    assert changeset['rosdistro'] == 'hydro'
+    assert changeset['create'] == ['ros-hydro-new_sourcedeb']
+    assert changeset['update'] == ['ros-hydro-changed_binarydeb_precise_amd64']
+    assert changeset['delete'] == ['ros-hydro-extra_sourcedeb']
+    assert changeset['unchanged'] == ['ros-hydro-unchanged_sourcedeb']
+    assert sorted(changeset['configs'].keys()) == ['ros-hydro-changed_binarydeb_precise_amd64', 'ros-hydro-new_sourcedeb']
+
+    # jobs with unknown configs are updated
+    snapshot.set('ros-hydro-unchanged_sourcedeb', None)
+    changeset = _make_plan().get_changeset(snapshot)
+    assert 'ros-hydro-unchanged_sourcedeb' in changeset['update']
+
+
+def test_plan_and_apply():
+    with TempDir() as tmpdir:
+        server = _make_server()
+        fingerprints = JobFingerprints(os.path.join(tmpdir, 'fingerprints.json'), URL)
+        snapshot = JobFingerprints(os.path.join(tmpdir, 'snapshot.json'), URL)
+        job_plan.update_snapshot(snapshot, server, 'hydro', fingerprints, max_workers=2)
+
+        path = os.path.join(tmpdir, 'changeset.json')
+        job_plan.write_changeset(path, _make_plan().get_changeset(snapshot))
+        changeset = job_plan.read_changeset(path)
+
+        server.requests = []
+        results = job_plan.apply_changeset(changeset, server, 'hydro', fingerprints, snapshot, max_workers=2)
+        assert results[0] == []
+        assert sorted(results[1]) == [
+            'ros-hydro-changed_binarydeb_precise_amd64', 'ros-hydro-extra_sourcedeb', 'ros-hydro-new_sourcedeb']
+        assert results[2] == []
+        # no configs are compared with the server again
+        assert sorted(server.requests) == [
+            ('create_job', 'ros-hydro-new_sourcedeb'),
+            ('delete_job', 'ros-hydro-extra_sourcedeb'),
+            ('job_exists', 'ros-hydro-new_sourcedeb'),
+            ('reconfig_job', 'ros-hydro-changed_binarydeb_precise_amd64')]
+        assert 'ros-hydro-extra_sourcedeb' not in server.jobs
+        assert fingerprints.get('ros-hydro-new_sourcedeb') == get_config_fingerprint(make_config('new'))
+
+        # afterwards the snapshot is up-to-date
+        assert 'ros-hydro-extra_sourcedeb' not in snapshot
+        changeset = _make_plan().get_changeset(snapshot)
+        assert changeset['create'] == changeset['update'] == []
+        assert len(changeset['unchanged']) == 3
+
+
+def test_apply_failed_delete():
+    server = _make_server()
+    snapshot = JobFingerprints('/nonexistent', URL)
+    snapshot.set('ros-hydro-missing_sourcedeb', None)
+    changeset = job_plan.JobPlan('hydro').get_changeset(snapshot)
+    changeset['create'] = ['ros-hydro-new_sourcedeb']
+    changeset['configs']['ros-hydro-new_sourcedeb'] = make_config('new')
+    changeset['delete'] = ['ros-hydro-missing_sourcedeb', 'ros-hydro-extra_sourcedeb']
+
+    results = job_plan.apply_changeset(changeset, server, 'hydro', snapshot=snapshot, max_workers=2)
+    assert results == ([], ['ros-hydro-new_sourcedeb', 'ros-hydro-extra_sourcedeb'], ['ros-hydro-missing_sourcedeb'])
+    # the remaining deletes are still applied and the snapshot is updated
+    assert 'ros-hydro-extra_sourcedeb' not in server.jobs
+    assert snapshot.get_job_names() == set(['ros-hydro-new_sourcedeb'])
+
+
+def test_push_existing_job():
+    server = FakeJenkins({'ros-hydro-new_sourcedeb': make_config('old')}, url=URL)
+    # planned as a new job, but e.g. a previous attempt to create it has
+    # succeeded on the server although the request failed
+    assert push_jenkins_job('ros-hydro-new_sourcedeb', make_config('new'), server, False)
+    assert server.requests == [('job_exists', 'ros-hydro-new_sourcedeb'), ('reconfig_job', 'ros-hydro-new_sourcedeb')]
+    assert get_remote_config_fingerprint(server.jobs['ros-hydro-new_sourcedeb']) == get_config_fingerprint(make_config('new'))
+
+
+def test_apply_mismatch():
+    snapshot = JobFingerprints('/nonexistent', URL)
+    changeset = job_plan.JobPlan('hydro').get_changeset(snapshot)
+    for server, rosdistro in [(FakeJenkins(url='http://other.example.com/'), 'hydro'), (FakeJenkins(url=URL), 'indigo')]:
+        try:
+            job_plan.apply_changeset(changeset, server, rosdistro)
+        except RuntimeError:
+            pass
+        else:
+            assert False
+        assert server.requests == []
@@ -0,0 +1,126 @@
+import socket
+import threading
+import urllib2
+
+import jenkins
+
+from buildfarm.job_pool import is_transient_error, JobPool
+from buildfarm.release_jobs import configure_jenkins_job
+
+from fake_jenkins import FakeJenkins, make_config
+
+
+def test_is_transient_error():
+    assert is_transient_error(jenkins.TimeoutException('Error in request: timed out'))
+    assert is_transient_error(jenkins.JenkinsException('Error in request: [Errno 111] Connection refused'))
+    assert is_transient_error(jenkins.JenkinsException('Error in request. Possibly authentication failed [500]: Server Error'))
+    assert is_transient_error(urllib2.HTTPError('http://example.com', 503, 'Unavailable', {}, None))
+    assert is_transient_error(urllib2.URLError('refused'))
+    assert is_transient_error(socket.error())
+
+    assert not is_transient_error(jenkins.JenkinsException('Error in request. Possibly authentication failed [401]: Unauthorized'))
+    assert not is_transient_error(jenkins.JenkinsException('job[foo] already exists'))
+    assert not is_transient_error(jenkins.NotFoundException('Requested item could not be found'))
+    assert not is_transient_error(urllib2.HTTPError('http://example.com', 400, 'Bad Request', {}, None))
+    assert not is_transient_error(ValueError())
+
+
+def test_results():
+    def configure(job_name, config):
+        if config == 'raise':
+            raise jenkins.JenkinsException('job[%s] already exists' % job_name)
+        return config == 'ok'
+    pool = JobPool(configure, max_workers=3)
+    for job_name, config in [('a', 'ok'), ('b', 'fail'), ('c', 'raise'), ('d', 'ok')]:
+        pool.submit(job_name, config)
+    pool.join()
+    unattempted, successful, failed = pool.update_results(['a', 'b', 'c', 'd', 'e'], ['x'], ['y'])
+    assert unattempted == ['e']
+    assert successful == ['x', 'a', 'd']
+    assert failed == ['y', 'b', 'c']
+
+
+def test_retry_transient_errors():
+    attempts = {}
+    lock = threading.Lock()
+
+    def configure(job_name, config):
+        with lock:
+            attempts[job_name] = attempts.get(job_name, 0) + 1
+            attempt = attempts[job_name]
+        if attempt <= config:
+            raise jenkins.JenkinsException('Error in request: [Errno 111] Connection refused')
+        return True
+    pool = JobPool(configure, max_workers=4, retries=2, retry_period=0)
+    limit = pool.limit
+    pool.submit('flaky', 2)
+    pool.submit('broken', 3)
+    pool.join()
+    assert pool.update_results(['flaky', 'broken'], [], []) == ([], ['flaky'], ['broken'])
+    assert attempts == {'flaky': 3, 'broken': 3}
+    # the concurrency has been reduced after the errors
+    assert pool.limit < limit
+
+
+def test_retry_create_which_succeeded():
+    class TimeoutJenkins(FakeJenkins):
+        def create_job(self, name, config):
+            # the job is created but the response never arrives
+            FakeJenkins.create_job(self, name, config)
+            raise jenkins.TimeoutException('Error in request: timed out')
+
+    server = TimeoutJenkins()
+    pool = JobPool(lambda job_name, config: configure_jenkins_job(job_name, config, server, set()),
+                   max_workers=1, retry_period=0)
+    pool.submit('a', make_config('foo'))
+    pool.join()
+    assert pool.update_results(['a'], [], []) == ([], ['a'], [])
+    assert server.requests == [
+        ('job_exists', 'a'), ('create_job', 'a'),
+        ('job_exists', 'a'), ('reconfig_job', 'a')]
+
+
+def test_no_retry_for_other_errors():
+    attempts = []
+
+    def configure(job_name, config):
+        attempts.append(job_name)
+        raise jenkins.JenkinsException('Error in request. Possibly authentication failed [403]: Forbidden')
+    pool = JobPool(configure, max_workers=2, retry_period=0)
+    pool.submit('a', None)
+    pool.join()
+    assert pool.update_results(['a'], [], []) == ([], [], ['a'])
+    assert attempts == ['a']
+
+
+def test_cancel():
+    started = threading.Event()
+    release = threading.Event()
+    configured = []
+
+    def configure(job_name, config):
+        configured.append(job_name)
+        started.set()
+        release.wait()
+        return True
+    pool = JobPool(configure, max_workers=2, min_workers=1)
+    pool.limit = 1
+    for i in range(5):
+        pool.submit('job%d' % i, None)
+    started.wait()
+    pool.cancel()
+    release.set()
+    pool.join()
+    # only the running job has been finished, the pending ones are dropped
+    assert configured == ['job0']
+    unattempted = ['job%d' % i for i in range(1, 5)]
+    assert pool.update_results(['job%d' % i for i in range(5)], [], []) == (unattempted, ['job0'], [])
+
+
+def test_increase_limit():
+    pool = JobPool(lambda job_name, config: True, max_workers=4, increase_after=2)
+    assert pool.limit == 2
+    for i in range(10):
+        pool.submit('job%d' % i, None)
+    pool.join()
+    assert pool.limit == 4
@@ -0,0 +1,41 @@
+from buildfarm.pdiff import apply_ed_script, get_patch_names, parse_diff_index, PdiffError
+
+
+def test_apply_ed_script():
+    lines = ['a', 'b', 'c', 'd', 'e']
+    # commands are in reverse line order as generated by 'diff --ed'
+    script = ['5a', 'f', '.', '3,4c', 'C', 'D', 'DD', '.', '1d', '']
+    apply_ed_script(lines, script)
+    assert lines == ['b', 'C', 'D', 'DD', 'e', 'f']
+
+
+def test_apply_ed_script_invalid():
+    for script in [['1x'], ['1a', 'unterminated']]:
+        try:
+            apply_ed_script(['a'], script)
+        except PdiffError:
+            pass
+        else:
+            assert False, 'PdiffError not raised for %s' % script
+
+
+def test_parse_diff_index():
+    stanza = {
+        'SHA256-Current': 'cur 1234',
+        'SHA256-History': 'h1 100 2014-01-01-0000.00\nh2 110 2014-01-02-0000.00',
+    }
+    current, history = parse_diff_index(stanza)
+    assert current == 'cur'
+    assert history == [('h1', '2014-01-01-0000.00'), ('h2', '2014-01-02-0000.00')]
+    try:
+        parse_diff_index({})
+    except PdiffError:
+        pass
+    else:
+        assert False
+
+
+def test_get_patch_names():
+    history = [('h1', 'p1'), ('h2', 'p2'), ('h3', 'p3')]
+    assert get_patch_names(history, 'h2') == ['p2', 'p3']
+    assert get_patch_names(history, 'unknown') is None
@@ -0,0 +1,24 @@
+from buildfarm.repo import PackagesIndex
+
+SOURCES = """Package: ros-hydro-foo
+Binary: ros-hydro-foo, ros-hydro-foo-dbg
+Version: 1.2.3-0precise
+
+Package: ros-hydro-bar
+Binary: ros-hydro-bar
+Version: 0.1.0-0precise-20140101
+"""
+
+
+def test_packages_index():
+    index = PackagesIndex(SOURCES)
+    assert index.has_version('ros-hydro-foo', '1.2.3-0precise')
+    assert not index.has_version('ros-hydro-foo', '1.2')
+    assert index.has_version('ros-hydro-foo', '1.2', prefix=True)
+    assert index.has_version('ros-hydro-bar', '0.1.0-0precise.*')
+    assert not index.has_version('ros-hydro-baz', '0.1.0')
+
+    assert index.binaries == {
+        'ros-hydro-foo': ['ros-hydro-foo', 'ros-hydro-foo-dbg'],
+        'ros-hydro-bar': ['ros-hydro-bar'],
+    }
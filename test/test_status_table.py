@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+
+from buildfarm.status_table import read_status_table, StatusRow, StatusTable, StringDictionary, write_status_table
+
+DA_STRS = ['precise_source', 'precise_amd64']
+
+
+def _make_rows():
+    return [
+        StatusRow('bar', 'bar_repo', '1.0.0-0', 'wet', [('1.0.0-0', 'None', 'None'), ('1.0.0-0', '0.9.0-0', 'None')]),
+        StatusRow('foo', '', '2.0.0-0', 'dry', [('None', 'None', '2.0.0-0'), ('None', 'None', '2.0.0-0')]),
+        StatusRow('n\xc3\xa4me', '', '', 'unknown', [('None', 'None', 'None'), ('3.0.0-0', 'None', 'None')]),
+    ]
+
+
+def _rows_to_tuples(rows):
+    return [(r.name, r.repo, r.version, r.type, list(r.cells)) for r in rows]
+
+
+def test_string_dictionary():
+    strings = StringDictionary()
+    assert [strings.get_code(s) for s in ['a', 'b', 'a']] == [0, 1, 0]
+    assert strings.strings == ['a', 'b']
+
+
+def test_string_dictionary_normalize():
+    calls = []
+
+    def normalize(value):
+        calls.append(value)
+        return str(value).lower()
+    strings = StringDictionary(normalize)
+    assert [strings.get_code(s) for s in ['A', 'a', 'A', None]] == [0, 0, 0, 1]
+    assert strings.strings == ['a', 'none']
+    # each distinct value is only normalized once
+    assert calls == ['A', 'a', None]
+
+
+def test_status_row_csv():
+    row = _make_rows()[0]
+    csv_row = row.to_csv_row()
+    assert csv_row == ['bar', 'bar_repo', '1.0.0-0', 'wet', '1.0.0-0|None|None', '1.0.0-0|0.9.0-0|None']
+    assert _rows_to_tuples([StatusRow.from_csv_row(csv_row)]) == _rows_to_tuples([row])
+
+
+def test_round_trip():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'test.table')
+        rows = _make_rows()
+        write_status_table(DA_STRS, rows, path)
+
+        da_strs, read_rows = read_status_table(path)
+        assert da_strs == DA_STRS
+        assert _rows_to_tuples(read_rows) == _rows_to_tuples(rows)
+
+        table = StatusTable(path)
+        assert len(table) == 3
+        assert table.get_row_index('foo') == 1
+        assert table.get_row_index('unknown') is None
+        assert table.get_versions('bar', 'precise_amd64') == ('1.0.0-0', '0.9.0-0', 'None')
+        assert table.get_versions('unknown', 'precise_amd64') is None
+        assert _rows_to_tuples([table.get_status_row(2)]) == _rows_to_tuples(rows[2:])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_empty_table():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'empty.table')
+        write_status_table(DA_STRS, [], path)
+        assert read_status_table(path) == (DA_STRS, [])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_invalid_file():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'invalid.table')
+        with open(path, 'wb') as f:
+            f.write('XXXX' + '\0' * 8)
+        try:
+            StatusTable(path)
+        except RuntimeError:
+            pass
+        else:
+            assert False
+    finally:
+        shutil.rmtree(tmpdir)